@@ -1,9 +1,52 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Request, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 from contextlib import asynccontextmanager
 
 from backend.app.core import settings, get_api_key_or_raise
 
+async def _warm_up(app: FastAPI) -> None:
+    """
+    Open the Gemini, embedding and Qdrant connections before the first request.
+    
+    Connection setup (TLS, gRPC channel, loading the collection) otherwise lands
+    on whichever user happens to be first. Failures are logged and ignored.
+    """
+    from backend.app.services.vector_store import generate_embedding
+    
+    warmups = {}
+    if app.state.chat_model:
+        warmups["chat model"] = app.state.chat_model.generate_content_async("ping")
+        if not app.state.embedder:
+            warmups["embedding"] = asyncio.to_thread(generate_embedding, "warmup")
+    if app.state.embedder:
+        warmups["embedding"] = app.state.embedder.embed("warmup")
+    if app.state.qdrant_client and app.state.collection_name:
+        warmups["qdrant"] = asyncio.to_thread(
+            app.state.qdrant_client.search,
+            collection_name=app.state.collection_name,
+            query_vector=[1.0] + [0.0] * (settings.EMBEDDING_DIMENSION - 1),
+            limit=1
+        )
+    if not warmups:
+        return
+    
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(*warmups.values(), return_exceptions=True),
+            timeout=settings.STARTUP_WARMUP_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        print("Warning: Warm-up timed out, continuing startup.")
+        return
+    for name, result in zip(warmups, results):
+        if isinstance(result, Exception):
+            print(f"Warning: {name} warm-up failed: {result}")
+    print("Warm-up complete.")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -21,8 +64,14 @@ async def lifespan(app: FastAPI):
         api_key = get_api_key_or_raise("GEMINI_API_KEY")
         genai.configure(api_key=api_key)
         
-        # Initialize chat model
-        app.state.chat_model = genai.GenerativeModel('gemini-2.0-flash')
+        # Initialize chat model; every generate call shares one concurrency limit
+        from backend.app.services.gemini import ConcurrencyLimitedModel
+        
+        app.state.gemini_sem = asyncio.Semaphore(settings.GEMINI_CONCURRENCY)
+        app.state.chat_model = ConcurrencyLimitedModel(
+            genai.GenerativeModel('gemini-2.0-flash'),
+            app.state.gemini_sem
+        )
         print("Chat Model Initialized.")
     except Exception as e:
         print(f"ERROR: Failed to initialize Chat Model: {e}")
@@ -48,6 +97,45 @@ async def lifespan(app: FastAPI):
         app.state.qdrant_client = None
         app.state.collection_name = None
     
+    # Initialize the async embedding client if enabled
+    app.state.embedder = None
+    if settings.GEMINI_ASYNC_EMBEDDINGS:
+        try:
+            from backend.app.services.embedding_client import AsyncGeminiEmbedder, EmbeddingBatcher
+            
+            app.state.embedder = AsyncGeminiEmbedder(get_api_key_or_raise("GEMINI_API_KEY"))
+            print("Async Embedding Client Initialized.")
+            if settings.GEMINI_EMBED_BATCH_WINDOW_MS > 0:
+                # Same embed()/aclose() interface, so callers don't change
+                app.state.embedder = EmbeddingBatcher(app.state.embedder)
+                app.state.embedder.start()
+                print("Embedding micro-batching enabled.")
+        except Exception as e:
+            print(f"ERROR: Failed to initialize async embedding client: {e}")
+            app.state.embedder = None
+    
+    # Initialize the semantic response cache if enabled
+    app.state.response_cache = None
+    if settings.RESPONSE_CACHE_ENABLED and app.state.qdrant_client:
+        try:
+            from backend.app.services.vector_store import get_or_create_collection
+            from backend.app.services.response_cache import ResponseCache
+            
+            cache_collection = get_or_create_collection(app.state.qdrant_client, settings.RESPONSE_CACHE_COLLECTION)
+            if cache_collection:
+                app.state.response_cache = ResponseCache(
+                    app.state.qdrant_client,
+                    cache_collection,
+                    embedder=app.state.embedder
+                )
+                print(f"Response cache initialized: {cache_collection}")
+        except Exception as e:
+            print(f"ERROR: Failed to initialize response cache: {e}")
+            app.state.response_cache = None
+    
+    if settings.STARTUP_WARMUP:
+        await _warm_up(app)
+    
     yield
     
     # Shutdown: Clean up resources
@@ -67,6 +155,15 @@ async def lifespan(app: FastAPI):
     
     app.state.qdrant_client = None
     app.state.collection_name = None
+    
+    if getattr(app.state, "embedder", None):
+        try:
+            await app.state.embedder.aclose()
+            print("Async embedding client closed.")
+        except Exception as e:
+            print(f"Error closing async embedding client: {e}")
+    app.state.embedder = None
+    app.state.response_cache = None
 
 
 def create_application() -> FastAPI:
@@ -89,6 +186,16 @@ def create_application() -> FastAPI:
         allow_headers=["*"],
     )
     
+    @app.exception_handler(ValidationError)
+    async def validation_error_handler(request: Request, exc: ValidationError):
+        """Return 422 for bodies validated in-route, matching FastAPI's own request validation."""
+        # FastAPI prefixes body errors with "body", so clients see the same loc either way
+        errors = [{**err, "loc": ("body", *err["loc"])} for err in exc.errors(include_url=False)]
+        return JSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content={"detail": jsonable_encoder(errors)}
+        )
+    
     # Include API router
     from backend.app.api import api_router
     app.include_router(api_router, prefix=settings.API_V1_STR)
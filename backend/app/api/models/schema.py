@@ -1,10 +1,33 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
+from backend.app.core import settings
+
+# Request/response DTOs are never modified after validation; unknown keys are dropped
+DTO_CONFIG = ConfigDict(extra='ignore', frozen=True)
 
 class PromptRequest(BaseModel):
+    model_config = DTO_CONFIG
+
     prompt: str
 
+class BatchPromptRequest(BaseModel):
+    model_config = DTO_CONFIG
+
+    prompts: List[str] = Field(
+        ...,
+        max_length=settings.CHAT_BATCH_MAX_PROMPTS,
+        description="Prompts to generate responses for, in order"
+    )
+
+class BatchPromptResponse(BaseModel):
+    model_config = DTO_CONFIG
+
+    # One entry per prompt, None where generation failed
+    responses: List[Optional[str]]
+
 class ScenarioData(BaseModel):
+    model_config = DTO_CONFIG
+
     # Define fields expected from the frontend form
     scenario_type: str = Field(..., description="Type of scenario (e.g., dating)")
     setting: str = Field(..., description="Setting of the scenario (e.g., coffee_shop)")
@@ -20,13 +43,19 @@ class ScenarioIDResponse(BaseModel):
 
 # Example model for a chat endpoint that might use the initialized resources
 class ChatInput(BaseModel):
+    model_config = DTO_CONFIG
+
     scenario_id: str
     user_input: str
 
 class AIResponse(BaseModel):
+    model_config = DTO_CONFIG
+
     content: str
 
 class AssessmentResponse(BaseModel):
+    model_config = DTO_CONFIG
+
     # Define the expected structure of the assessment JSON
     primary_archetype: Optional[str] = None
     secondary_archetype: Optional[str] = None
@@ -39,4 +68,21 @@ class AssessmentResponse(BaseModel):
     # overall_score: Optional[int] = None
     # feedback: Optional[str] = None
     # stats: Optional[dict] = None
-    raw_text_response: Optional[str] = None # Field for fallback
\ No newline at end of file
+    raw_text_response: Optional[str] = None # Field for fallback
+
+def json_body_schema(model) -> dict:
+    """
+    OpenAPI requestBody for routes that read and validate their raw JSON body themselves.
+    
+    Args:
+        model: The Pydantic model the body is validated against
+        
+    Returns:
+        The openapi_extra dict documenting the body as that model
+    """
+    return {
+        "requestBody": {
+            "content": {"application/json": {"schema": model.model_json_schema()}},
+            "required": True
+        }
+    }
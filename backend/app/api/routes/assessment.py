@@ -1,7 +1,6 @@
+import asyncio
 from fastapi import APIRouter, Request, HTTPException, status
 from typing import Dict, Any, Optional
-import json
-import os
 
 # Import models
 from backend.app.api.models.schema import AssessmentResponse
@@ -9,8 +8,6 @@ from backend.app.api.models.schema import AssessmentResponse
 # Import services
 from backend.app.services.scenarios import get_scenario, get_conversation_history, flush_conversation_to_s3, save_assessment_to_s3
 from backend.app.services.assessments import generate_conversation_assessment
-from backend.app.utils.cleaner import clean_gemini_output
-from backend.app.core import settings
 
 router = APIRouter()
 
@@ -28,15 +25,17 @@ async def get_conversation_assessment(scenario_id: str, request: Request):
         raise HTTPException(status_code=503, detail="Gemini chat model service not available")
 
     # 1. Retrieve conversation data using the scenarios service
-    scenario_data = get_scenario(scenario_id)
+    # Scenario helpers may round-trip to Redis, so run them off the event loop
+    scenario_data = await asyncio.to_thread(get_scenario, scenario_id)
     if not scenario_data:
         raise HTTPException(status_code=404, detail=f"Conversation scenario '{scenario_id}' not found.")
     
-    conversation_history = get_conversation_history(scenario_id)
+    conversation_history = await asyncio.to_thread(get_conversation_history, scenario_id)
     if not conversation_history:
         raise HTTPException(status_code=400, detail="Cannot assess an empty conversation.")
 
-    flush_conversation_to_s3(scenario_id)
+    # S3 uploads are blocking calls, so run them off the event loop
+    await asyncio.to_thread(flush_conversation_to_s3, scenario_id)
 
     # 2. Generate assessment using the service
     try:
@@ -49,18 +48,19 @@ async def get_conversation_assessment(scenario_id: str, request: Request):
         
         if result["status"] == "error":
             print(f"ERROR: Assessment generation failed for {scenario_id}: {result.get('error', 'Unknown error')}")
-            assessment_result = AssessmentResponse(raw_text_response=result["raw_text_response"])
+            # The fallback only carries our own raw text, so there is nothing to validate
+            assessment_result = AssessmentResponse.model_construct(raw_text_response=result["raw_text_response"])
         else:
             assessment_json = result["assessment"]
             try:
-                assessment_result = AssessmentResponse(**assessment_json)
+                # Validate the already-parsed dict directly, without unpacking it into kwargs
+                assessment_result = AssessmentResponse.model_validate(assessment_json)
            
             except Exception as validation_error: # Catch potential Pydantic validation errors
                 print(f"WARNING: Assessment JSON failed validation for {scenario_id}: {validation_error}")
                 # Create a fallback response object with raw text
-                assessment_result = AssessmentResponse(raw_text_response=generated_text)
+                assessment_result = AssessmentResponse.model_construct(raw_text_response=result.get("raw_text_response"))
 
-        
     except Exception as e:
         print(f"Error generating assessment for {scenario_id}: {e}")
         raise HTTPException(
@@ -72,12 +72,12 @@ async def get_conversation_assessment(scenario_id: str, request: Request):
     if assessment_result:
         try:
             # save to s3
-            save_assessment_to_s3(scenario_id, assessment_result)
+            await asyncio.to_thread(save_assessment_to_s3, scenario_id, assessment_result.model_dump())
             
-       except Exception as err:
+        except Exception as save_err:
             print(f"ERROR: An unexpected error occurred while saving assessment log: {save_err}")
             # Log the error, but don't prevent the API from returning the assessment
-# --- End File Saving Logic ---
+    # --- End File Saving Logic ---
 
     # 4. Return the assessment
     return assessment_result 
\ No newline at end of file
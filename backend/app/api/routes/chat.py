@@ -1,22 +1,33 @@
+import asyncio
 from fastapi import APIRouter, Request, HTTPException, status
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any
 
 # Import models
-from backend.app.api.models.schema import ChatInput, AIResponse
+from backend.app.api.models.schema import ChatInput, AIResponse, BatchPromptRequest, BatchPromptResponse, json_body_schema
 
 # Import services
-from backend.app.services.scenarios import get_scenario, get_conversation_history, add_conversation_message
-from backend.app.services.chat import process_chat
+from backend.app.services.scenarios import (
+    get_scenario,
+    get_conversation_history,
+    get_formatted_history,
+    add_conversation_message,
+    get_turn_embeddings
+)
+from backend.app.core import settings
+from backend.app.services.chat import process_chat, build_chat_prompt, stream_chat
 from backend.app.services.vector_service import VectorService
 
 router = APIRouter()
 
-@router.post("/process_chat", response_model=AIResponse)
-async def process_chat_message(request: Request, chat_input: ChatInput):
+@router.post("/process_chat", response_model=AIResponse, openapi_extra=json_body_schema(ChatInput))
+async def process_chat_message(request: Request):
     """
     Handles a chat message: retrieves context, formats prompt, gets AI response,
     and updates conversation history.
     """
+    # Parse the raw body straight into the model; ValidationError is mapped to a 422
+    chat_input = ChatInput.model_validate_json(await request.body())
     print(f"Received chat input: {chat_input}")
     
     # 1. Access resources initialized in lifespan
@@ -29,14 +40,15 @@ async def process_chat_message(request: Request, chat_input: ChatInput):
         raise HTTPException(status_code=503, detail="Chat model service not available")
     
     # 2. Retrieve scenario details and history from storage
-    scenario_data = get_scenario(chat_input.scenario_id)
+    # Scenario helpers may round-trip to Redis, so run them off the event loop
+    scenario_data = await asyncio.to_thread(get_scenario, chat_input.scenario_id)
     print(f"Scenario data")
     if not scenario_data:
         raise HTTPException(status_code=404, detail=f"Scenario '{chat_input.scenario_id}' not found.")
     
     # Get conversation history before adding the new message
     try:
-        conversation_history = get_conversation_history(chat_input.scenario_id)
+        conversation_history = await asyncio.to_thread(get_conversation_history, chat_input.scenario_id)
         print(f"Conversation history")
     except Exception as e:
         raise HTTPException(status_code=402, detail=f"Error getting conversation history: {str(e)}")
@@ -45,7 +57,9 @@ async def process_chat_message(request: Request, chat_input: ChatInput):
     
     vector_service = VectorService(
         qdrant_client,
-        collection_name
+        collection_name,
+        embedder=getattr(request.app.state, "embedder", None),
+        turn_embeddings=await asyncio.to_thread(get_turn_embeddings, chat_input.scenario_id) if settings.RETRIEVAL_TURN_EMBEDDINGS else None
     )
         
     print(f"Vector service")
@@ -59,7 +73,9 @@ async def process_chat_message(request: Request, chat_input: ChatInput):
             scenario_data=scenario_data,
             conversation_history=conversation_history,
             chat_model=chat_model,
-            vector_service=vector_service
+            vector_service=vector_service,
+            response_cache=getattr(request.app.state, "response_cache", None),
+            formatted_history=await asyncio.to_thread(get_formatted_history, chat_input.scenario_id)
         )
         print(f"Result")
         if result["status"] == "error":
@@ -88,17 +104,21 @@ async def process_chat_message(request: Request, chat_input: ChatInput):
     # 5. Update conversation history
     try:
         # Add user message
-        add_conversation_message(
+        recorded = await asyncio.to_thread(
+            add_conversation_message,
             chat_input.scenario_id, 
             {"role": "user", "content": chat_input.user_input}
         )
         
         # Add assistant message
-        add_conversation_message(
+        await asyncio.to_thread(
+            add_conversation_message,
             chat_input.scenario_id, 
             {"role": "assistant", "content": ai_response_text}
         )
         
+        if recorded:
+            vector_service.record_turn()
         print(f"Updated history for scenario: {chat_input.scenario_id}")
     except Exception as e:
         print(f"Error updating conversation history: {e}")
@@ -107,6 +127,77 @@ async def process_chat_message(request: Request, chat_input: ChatInput):
     # 6. Return the AI response
     return AIResponse(content=ai_response_text)
     
+@router.post("/process_chat_stream", openapi_extra=json_body_schema(ChatInput))
+async def process_chat_message_stream(request: Request):
+    """
+    Streaming variant of /process_chat: sends the AI response as plain text chunks
+    as they are generated, then updates conversation history with the full text.
+    """
+    chat_input = ChatInput.model_validate_json(await request.body())
+    chat_model = request.app.state.chat_model
+    if not chat_model:
+        raise HTTPException(status_code=503, detail="Chat model service not available")
+    
+    # Scenario helpers may round-trip to Redis, so run them off the event loop
+    scenario_data = await asyncio.to_thread(get_scenario, chat_input.scenario_id)
+    if not scenario_data:
+        raise HTTPException(status_code=404, detail=f"Scenario '{chat_input.scenario_id}' not found.")
+    
+    try:
+        conversation_history = await asyncio.to_thread(get_conversation_history, chat_input.scenario_id)
+    except Exception as e:
+        raise HTTPException(status_code=402, detail=f"Error getting conversation history: {str(e)}")
+    
+    vector_service = VectorService(
+        getattr(request.app.state, "qdrant_client", None),
+        getattr(request.app.state, "collection_name", None),
+        embedder=getattr(request.app.state, "embedder", None),
+        turn_embeddings=await asyncio.to_thread(get_turn_embeddings, chat_input.scenario_id) if settings.RETRIEVAL_TURN_EMBEDDINGS else None
+    )
+    
+    # Build the prompt before streaming starts so errors still map to a status code
+    try:
+        final_prompt = await build_chat_prompt(
+            user_input=chat_input.user_input,
+            scenario_id=chat_input.scenario_id,
+            scenario_data=scenario_data,
+            conversation_history=conversation_history,
+            vector_service=vector_service,
+            formatted_history=await asyncio.to_thread(get_formatted_history, chat_input.scenario_id)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"An error occurred while processing chat: {str(e)}")
+    
+    async def _stream():
+        chunks = []
+        try:
+            async for text in stream_chat(chat_model, final_prompt):
+                chunks.append(text)
+                yield text
+        except Exception as e:
+            # Headers are already sent, so the error can only be logged
+            print(f"Error streaming chat for scenario {chat_input.scenario_id}: {e}")
+            return
+        
+        # Only a completed response is recorded in the history
+        try:
+            recorded = await asyncio.to_thread(
+                add_conversation_message,
+                chat_input.scenario_id,
+                {"role": "user", "content": chat_input.user_input}
+            )
+            await asyncio.to_thread(
+                add_conversation_message,
+                chat_input.scenario_id,
+                {"role": "assistant", "content": "".join(chunks)}
+            )
+            if recorded:
+                vector_service.record_turn()
+        except Exception as e:
+            print(f"Error updating conversation history: {e}")
+    
+    return StreamingResponse(_stream(), media_type="text/plain")
+
 @router.post("/chat")
 async def handle_chat(request: Request, prompt_request: Any):
     """
@@ -114,4 +205,30 @@ async def handle_chat(request: Request, prompt_request: Any):
     """
     # This is a placeholder for the future implementation
     
-    return {"response": "Chat endpoint placeholder"} 
\ No newline at end of file
+    return {"response": "Chat endpoint placeholder"}
+
+@router.post("/chat_batch", response_model=BatchPromptResponse)
+async def handle_chat_batch(request: Request, batch_request: BatchPromptRequest):
+    """
+    Generates responses for several prompts in one request, so pipeline clients
+    pay the HTTP round trip once per batch instead of once per prompt.
+    """
+    chat_model = request.app.state.chat_model
+    if not chat_model:
+        raise HTTPException(status_code=503, detail="Chat model service not available")
+    response_cache = getattr(request.app.state, "response_cache", None)
+
+    async def _generate(index: int, prompt: str):
+        try:
+            if response_cache:
+                return await response_cache.generate(chat_model, prompt)
+            response = await chat_model.generate_content_async(prompt)
+            return response.text
+        except Exception as e:
+            print(f"Error generating response for batch prompt {index}: {e}")
+            return None
+
+    responses = await asyncio.gather(*[
+        _generate(index, prompt) for index, prompt in enumerate(batch_request.prompts)
+    ])
+    return BatchPromptResponse(responses=responses)
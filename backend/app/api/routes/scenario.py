@@ -1,27 +1,34 @@
+import asyncio
 from fastapi import APIRouter, Request, HTTPException, status
 from typing import Dict, Any
-import time
-import uuid
 
 # Import models
-from backend.app.api.models.schema import ScenarioData, ScenarioIDResponse
+from backend.app.api.models.schema import ScenarioData, ScenarioIDResponse, json_body_schema
 
 # Import services
 from backend.app.services.scenarios import create_scenario, get_scenario, generate_scenario_id
 
 router = APIRouter()
 
-@router.post("/scenario", response_model=ScenarioIDResponse, status_code=status.HTTP_201_CREATED)
-async def create_scenario_route(scenario_input: ScenarioData):
+@router.post(
+    "/scenario",
+    response_model=ScenarioIDResponse,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=json_body_schema(ScenarioData)
+)
+async def create_scenario_route(request: Request):
     """
     Receives scenario details from the frontend, generates a unique ID,
     stores the scenario (in-memory), and returns the unique scenario ID.
     """
+    # Parse the raw body straight into the model; ValidationError is mapped to a 422
+    scenario_input = ScenarioData.model_validate_json(await request.body())
     print(f"Received scenario input: {scenario_input}")
     try:
-        # Store the scenario using the service - we'll use the dict() method once
-        # to convert the Pydantic model to a regular dictionary
-        stored_scenario_id = create_scenario(scenario_input.dict())
+        # Store the scenario using the service - model_dump converts the validated
+        # model to a plain dict once (dict() is the deprecated v1 alias)
+        # create_scenario uploads to S3 with a blocking call, so run it off the event loop
+        stored_scenario_id = await asyncio.to_thread(create_scenario, scenario_input.model_dump())
         print(f"Scenario created and stored (in-memory): {stored_scenario_id}")
 
         # Return only the ID
@@ -39,9 +46,10 @@ async def get_scenario_data(scenario_id: str):
     Retrieves the full scenario data for a given scenario ID.
     """
     print(f"Received request for scenario data: {scenario_id}")
-    scenario_data = get_scenario(scenario_id)
+    # get_scenario may round-trip to Redis, so run it off the event loop
+    scenario_data = await asyncio.to_thread(get_scenario, scenario_id)
     if not scenario_data:
         raise HTTPException(status_code=404, detail=f"Scenario '{scenario_id}' not found.")
     
-    # Return the scenario data as a ScenarioData model
-    return ScenarioData(**scenario_data) 
\ No newline at end of file
+    # Stored data was validated on creation, so build the model without re-validating it
+    return ScenarioData.model_construct(**scenario_data) 
\ No newline at end of file
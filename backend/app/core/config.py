@@ -21,6 +21,17 @@ class Settings(BaseSettings):
     QDRANT_URL: Optional[str] = ""
     QDRANT_API_KEY: Optional[str] = ""
     
+    # Server settings - more than one worker needs REDIS_URL, since scenarios are otherwise per process
+    WORKERS: int = 1
+    RELOAD: bool = False
+    # Make one Gemini, embedding and Qdrant call at startup so the first user doesn't pay for it
+    STARTUP_WARMUP: bool = True
+    STARTUP_WARMUP_TIMEOUT: float = 15.0
+    
+    # Redis settings - scenarios are kept in process memory when REDIS_URL is empty
+    REDIS_URL: Optional[str] = ""
+    REDIS_MAX_CONNECTIONS: int = 32
+    
     # AWS settings - defining them as Fields with default None to allow them in the model
     aws_access_key_id: Optional[str] = Field(None, exclude=True)
     aws_secret_access_key: Optional[str] = Field(None, exclude=True)
@@ -34,12 +45,36 @@ class Settings(BaseSettings):
     DATA_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
     DOWNLOADS_DIR: str = os.path.join(DATA_DIR, "downloads")
     ARCHETYPES_FILE: str = os.path.join(DATA_DIR, "archetypes.json")
+    # Append every conversation turn to DOWNLOADS_DIR/{scenario_id}.ndjson as it happens
+    CONVERSATION_LOG_NDJSON: bool = False
 
     # Vector DB settings
     EMBEDDING_MODEL_NAME: str = "models/embedding-001"  
     BATCH_SIZE: int = 100
     COLLECTION_NAME: str = "transcript_blocks" 
     EMBEDDING_DIMENSION: int = 768
+    # Pause HNSW indexing while process_and_store_blocks ingests, rebuild once at the end
+    QDRANT_BULK_INGEST: bool = False
+    QDRANT_INDEXING_THRESHOLD: int = 20000  # Qdrant's default, restored after bulk ingest
+    # Embed chat retrieval queries over a shared async HTTP/2 client instead of the sync SDK
+    GEMINI_ASYNC_EMBEDDINGS: bool = False
+    GEMINI_EMBED_CONCURRENCY: int = 8  # Max in-flight embed requests per process
+    # Coalesce query embeddings arriving within this window into one batch request (0 disables)
+    GEMINI_EMBED_BATCH_WINDOW_MS: int = 0
+    GEMINI_EMBED_BATCH_SIZE: int = 32
+    # Embed only the new user turn and query with the mean of the recent turn embeddings
+    RETRIEVAL_TURN_EMBEDDINGS: bool = False
+    TURN_EMBEDDING_CACHE_SCENARIOS: int = 1024  # Scenarios whose embeddings each process keeps with Redis
+    # Max concurrent generate calls per process; requests over the limit wait their turn
+    GEMINI_CONCURRENCY: int = 16
+    # Concurrent identical prompts share one in-flight generate call
+    GEMINI_SINGLE_FLIGHT: bool = True
+    CHAT_BATCH_MAX_PROMPTS: int = 64  # Largest prompt list /chat_batch accepts in one request
+    # Serve near-duplicate prompts from a Qdrant cache instead of calling Gemini
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_COLLECTION: str = "llm_response_cache"
+    RESPONSE_CACHE_MIN_SCORE: float = 0.95  # Cosine similarity, i.e. distance below 0.05
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
     
     @model_validator(mode='before')
     @classmethod
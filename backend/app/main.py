@@ -8,5 +8,15 @@ app = create_application()
 if __name__ == "__main__":
     print("✅ FRONTEND_URL:", settings.FRONTEND_URL)
     print("✅ CORS ORIGINS:", settings.BACKEND_CORS_ORIGINS)
-    # Run the application with uvicorn when script is executed directly
-    uvicorn.run("backend.app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    # Run the application with uvicorn when script is executed directly;
+    # uvloop and httptools replace the pure-Python event loop and HTTP parser
+    uvicorn.run(
+        "backend.app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        reload=settings.RELOAD,
+        # uvicorn ignores workers when reloading
+        workers=None if settings.RELOAD else settings.WORKERS
+    ) 
\ No newline at end of file
@@ -0,0 +1,139 @@
+import os
+import orjson
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(os.path.dirname(current_dir))
+# Set LLM_CACHE_DIR to an empty string to disable the cache
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(backend_dir, "data", "llm_cache"))
+
+# Sentinel for cache misses, since a cached response may itself be falsy
+MISS = object()
+
+
+def _cache_path(prompt: str) -> Optional[str]:
+    """Returns the cache file path for a prompt, or None if caching is disabled."""
+    if not LLM_CACHE_DIR:
+        return None
+    key = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(LLM_CACHE_DIR, f"{key}.json")
+
+
+def load_cached_response(prompt: str) -> Any:
+    """
+    Looks up the cached API response for a prompt.
+
+    Args:
+        prompt: The exact prompt sent to the API
+
+    Returns:
+        The cached response, or MISS if there is none
+    """
+    path = _cache_path(prompt)
+    if not path:
+        return MISS
+    try:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return MISS
+    except Exception as e:
+        print(f"Warning: Ignoring unreadable cache entry {path}: {e}")
+        return MISS
+
+
+def store_cached_response(prompt: str, response: Any) -> None:
+    """
+    Caches the API response for a prompt.
+
+    Args:
+        prompt: The exact prompt sent to the API
+        response: The parsed JSON response
+    """
+    path = _cache_path(prompt)
+    if not path:
+        return
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        # Write to a temp file first so an interrupted run never leaves a partial entry
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(response))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Warning: Failed to cache response at {path}: {e}")
+
+
+def cached_post(session, url: str, prompt: str, timeout: float = 90) -> Any:
+    """
+    POSTs a prompt to the API unless its response is already cached.
+
+    Args:
+        session: requests.Session used for the call
+        url: The API endpoint
+        prompt: The prompt to send
+        timeout: Request timeout in seconds
+
+    Returns:
+        The parsed JSON response, from the cache or the API
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails
+    """
+    cached = load_cached_response(prompt)
+    if cached is not MISS:
+        return cached
+    response = session.post(url, json={"prompt": prompt}, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    store_cached_response(prompt, data)
+    return data
+
+
+# Responses already fetched in this process, by prompt digest; shared across threads
+_memo: Dict[bytes, Future] = {}
+_memo_lock = threading.Lock()
+
+def memoized_post(session, url: str, prompt: str, timeout: float = 90) -> Any:
+    """
+    cached_post with an in-process memo in front of the disk cache.
+
+    Identical prompts reuse the response already fetched in this process, and
+    threads asking for a prompt that is still in flight wait for that call
+    instead of issuing their own. Failed calls are not memoized.
+
+    Args:
+        session: requests.Session used for the call
+        url: The API endpoint
+        prompt: The prompt to send
+        timeout: Request timeout in seconds
+
+    Returns:
+        The parsed JSON response
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails
+    """
+    key = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+    with _memo_lock:
+        future = _memo.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _memo[key] = future
+    if not is_owner:
+        return future.result()
+
+    try:
+        response = cached_post(session, url, prompt, timeout=timeout)
+    except Exception as e:
+        with _memo_lock:
+            _memo.pop(key, None)
+        future.set_exception(e)
+        raise
+    future.set_result(response)
+    return response
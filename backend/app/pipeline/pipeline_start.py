@@ -1,5 +1,6 @@
 import re
 import os
+import logging
 import sys
 import time
 from typing import Optional
@@ -161,4 +162,6 @@ def run_pipeline_interactive():
 
 # Example usage
 if __name__ == "__main__":
+    # Tagging logs go to stderr, keeping stdout for the interactive prompts
+    logging.basicConfig(level=os.getenv("LOGLEVEL", "INFO"))
     run_pipeline_interactive()
\ No newline at end of file
@@ -1,24 +1,253 @@
 import os
+import re
 import argparse
-import json
+import hashlib
+import logging
+import orjson
 import time
+import asyncio
+import threading
+from collections import Counter
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Optional, Dict, List, Any, Tuple
 
 # Import existing components
-from backend.app.pipeline.url_to_transcript import download_audio, transcribe_youtube_audio
+from backend.app.pipeline.url_to_transcript import download_audio, transcribe_youtube_audio, JSON_DUMP_OPTIONS
 from backend.app.utils.cleaner import clean_gemini_output
+from backend.app.pipeline.llm_cache import memoized_post, load_cached_response, store_cached_response, MISS
 from backend.data.prompts.prompts import tagging_prompt, chunking_prompt
 from backend.app.services.vector_store import initialize_embedding_model, initialize_qdrant_client, get_or_create_collection, process_and_store_blocks
 
+# Per-block tagging messages are DEBUG; set LOGLEVEL=DEBUG to see them
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 CHUNK_SIZE = 100
 OVERLAP = 20
 API_TIMEOUT = 60 
-DELAY_BETWEEN_CALLS = 5
+# Tagging calls allowed per second (0 = unpaced); a token bucket, so bursts up to one second's worth go out together
+TAGGING_CALLS_PER_SECOND = float(os.getenv("TAGGING_CALLS_PER_SECOND", "0"))
+TAGGING_WORKERS = int(os.getenv("TAGGING_WORKERS", "4"))  # Block tagging requests in flight at once
+MAX_CONCURRENT_REQUESTS = 8  # Chunk requests in flight at once against the API
 API_ENDPOINT = "http://localhost:8000/chat"  # Your Gemini API endpoint
+BATCH_API_ENDPOINT = API_ENDPOINT + "_batch"  # Accepts {"prompts": [...]}, returns {"responses": [...]}
+# Chunk prompts sent per request; above 1 the chunks go to the batch endpoint
+PROMPTS_PER_REQUEST = int(os.getenv("PROMPTS_PER_REQUEST", "1"))
+
+# Pooled keep-alive session for the tagging calls; retries transient gateway errors
+SESSION = requests.Session()
+SESSION.headers["Connection"] = "keep-alive"
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=None,  # Also retry POST; the API has no side effects
+        raise_on_status=False
+    )
+))
+
+
+class TokenBucket:
+    """Thread-safe token bucket that paces calls without a fixed sleep after each one."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens added per second; 0 or less disables pacing
+            capacity: Maximum burst size, defaults to one second's worth of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available, then takes it."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+TAGGING_RATE_LIMITER = TokenBucket(TAGGING_CALLS_PER_SECOND)
+
+
+def _chunk_result(chunk_num: int, start_line: int, end_line: int, api_result: Any) -> Dict[str, Any]:
+    """
+    Clean the API response for one transcript chunk.
+
+    Args:
+        chunk_num: 1-based chunk number
+        start_line: 0-based index of the chunk's first line
+        end_line: Index one past the chunk's last line
+        api_result: The generated text returned by the API
+
+    Returns:
+        Dict with the cleaned data for the chunk, or error details
+    """
+    print(f"Received raw response for chunk {chunk_num}.")
+
+    if not api_result:
+        print(f"Error: 'generated_text' key not found or empty in response for chunk {chunk_num}.")
+        return {"chunk_num": chunk_num, "error": "Missing generated_text", "raw_response": api_result}
+
+    cleaned_data = clean_gemini_output(api_result)
+    if not cleaned_data:
+        print(f"Error: Cleaning failed for chunk {chunk_num}.")
+        return {"chunk_num": chunk_num, "error": "Cleaning failed", "raw_response": api_result}
+
+    print(f"Successfully cleaned response for chunk {chunk_num}.")
+    # Store the cleaned data along with chunk info
+    return {
+        "chunk_num": chunk_num,
+        "start_line": start_line + 1,
+        "end_line": end_line,
+        "cleaned_data": cleaned_data
+    }
+
+
+async def _post_prompts(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    prompts: List[str],
+    label: str
+) -> Tuple[Optional[List[Any]], Optional[Dict[str, Any]]]:
+    """
+    Send prompts to the API, in one request to the batch endpoint when batching is enabled.
+
+    Args:
+        session: Shared aiohttp session
+        semaphore: Limits the number of requests in flight
+        prompts: Prompts to send
+        label: Description of the prompts for log messages
+
+    Returns:
+        (api_results, None) with one result per prompt, or (None, error_fields) if the request failed
+    """
+    if PROMPTS_PER_REQUEST > 1:
+        url, payload = BATCH_API_ENDPOINT, {"prompts": prompts}
+    else:
+        url, payload = API_ENDPOINT, {"prompt": prompts[0]}
+
+    try:
+        async with semaphore:
+            print(f"Sending request for {label} to {url}...")
+            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=API_TIMEOUT)) as response:
+                if response.status >= 400:
+                    response_body = await response.text()
+                    print(f"Error during API request for {label}: HTTP {response.status}")
+                    print(f"API Response Body: {response_body}")
+                    return None, {"error": f"HTTP {response.status}", "status_code": response.status, "response_body": response_body}
+                api_result = await response.json()
+    except asyncio.TimeoutError:
+        print(f"Error: Request timed out for {label}.")
+        return None, {"error": "Request timeout"}
+    except aiohttp.ClientError as e:
+        print(f"Error during API request for {label}: {e}")
+        return None, {"error": str(e)}
+    except Exception as e:
+        print(f"An unexpected error occurred processing {label}: {e}")
+        return None, {"error": f"Unexpected error: {str(e)}"}
+
+    if "prompt" in payload:
+        return [api_result], None
+
+    api_results = api_result.get("responses") if isinstance(api_result, dict) else None
+    if not isinstance(api_results, list) or len(api_results) != len(prompts):
+        print(f"Error: Batch response for {label} does not match the {len(prompts)} prompts sent.")
+        return None, {"error": "Malformed batch response", "raw_response": api_result}
+    return api_results, None
+
+
+def _line_offsets(text: str) -> List[int]:
+    """
+    Character offsets of each line start in text, followed by len(text).
+
+    text[offsets[a]:offsets[b]] equals "".join(lines[a:b]) for the lines
+    readlines() would return, so chunks can be sliced from the full text.
+    """
+    offsets = [0]
+    offsets.extend(match.end() for match in re.finditer("\n", text))
+    if offsets[-1] != len(text):
+        offsets.append(len(text))  # Last line has no trailing newline
+    return offsets
+
+
+async def _process_all_chunks(text: str, line_offsets: List[int], steps: int) -> List[Dict[str, Any]]:
+    """
+    Send all overlapping chunks of the transcript to the API concurrently.
+
+    Chunks whose prompt has a cached response are not sent. The rest are grouped
+    PROMPTS_PER_REQUEST at a time.
+
+    Args:
+        text: Full transcript text
+        line_offsets: Line start offsets from _line_offsets
+        steps: Distance between the first lines of consecutive chunks
+
+    Returns:
+        Per-chunk results in chunk order
+    """
+    num_lines = len(line_offsets) - 1
+    chunks = [
+        (chunk_num, i, min(i + CHUNK_SIZE, num_lines))
+        for chunk_num, i in enumerate(range(0, num_lines, steps), start=1)
+    ]
+
+    # 3. Prepare prompts, reusing responses cached by earlier runs
+    prompts = [
+        chunking_prompt(text[line_offsets[start_line]:line_offsets[end_line]])
+        for _, start_line, end_line in chunks
+    ]
+    api_results = [load_cached_response(prompt) for prompt in prompts]
+    misses = [index for index, api_result in enumerate(api_results) if api_result is MISS]
+    print(f"Prepared {len(prompts)} chunk prompts ({len(prompts) - len(misses)} cached).")
+
+    # 4. Send the remaining prompts; the semaphore replaces the fixed delay between calls
+    group_size = max(1, PROMPTS_PER_REQUEST)
+    groups = [misses[k:k + group_size] for k in range(0, len(misses), group_size)]
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    connector = aiohttp.TCPConnector(limit=16, keepalive_timeout=60)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        responses = await asyncio.gather(*[
+            _post_prompts(
+                session, semaphore, [prompts[index] for index in group],
+                "chunk(s) " + ", ".join(str(chunks[index][0]) for index in group)
+            )
+            for group in groups
+        ])
+
+    errors: Dict[int, Dict[str, Any]] = {}
+    for group, (group_results, error) in zip(groups, responses):
+        for position, index in enumerate(group):
+            if error:
+                errors[index] = error
+                continue
+            api_results[index] = group_results[position]
+            if api_results[index]:
+                store_cached_response(prompts[index], api_results[index])
+
+    return [
+        {"chunk_num": chunk_num, **errors[index]} if index in errors
+        else _chunk_result(chunk_num, start_line, end_line, api_results[index])
+        for index, (chunk_num, start_line, end_line) in enumerate(chunks)
+    ]
 
 
 def chunk_transcript(transcription_file: str) -> Optional[str]:
@@ -28,12 +257,12 @@ def chunk_transcript(transcription_file: str) -> Optional[str]:
 
     print(f"Reading text transcript from: {transcription_file}")
 
-    # 1. Read the plain text transcription file into lines
-    lines = []
+    # 1. Read the plain text transcription file and index its line starts
+    text = ""
     steps = CHUNK_SIZE - OVERLAP
     try:
         with open(transcription_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+            text = f.read()
     except FileNotFoundError:
         print(f"Error: Transcription file not found at {transcription_file}")
         exit(1)
@@ -41,83 +270,16 @@ def chunk_transcript(transcription_file: str) -> Optional[str]:
         print(f"An unexpected error occurred while reading the file: {e}")
         exit(1)
 
-    if not lines:
+    if not text:
         print(f"Error: File {transcription_file} is empty or could not be read.")
         exit(1)
 
-    print(f"Successfully read {len(lines)} lines from transcription file.")
-
-    all_results = [] # List to store results from each chunk
-    num_lines = len(lines)
-    chunk_num = 0
+    line_offsets = _line_offsets(text)
+    print(f"Successfully read {len(line_offsets) - 1} lines from transcription file.")
 
     # 2. Process the text in overlapping chunks
-    for i in range(0, num_lines, steps):
-        chunk_num += 1
-        start_line = i
-        end_line = min(i + CHUNK_SIZE, num_lines)
-        chunk_lines = lines[start_line:end_line]
-
-        if not chunk_lines: # Should not happen with range logic, but good practice
-            continue
-
-        print(f"\n--- Processing Chunk {chunk_num} (Lines {start_line + 1}-{end_line}) ---")
-        
-        # Join lines for the current chunk
-        chunk_text = "".join(chunk_lines)
-
-        # 3. Prepare prompt for the chunk
-        final_prompt = chunking_prompt(chunk_text) # Use the appropriate prompt function
-        print(f"Prepared prompt for chunk {chunk_num}.")
-        payload = {"prompt": final_prompt}
-
-        # 4. Send chunk to API
-        print(f"Sending request for chunk {chunk_num} to {API_ENDPOINT}...")
-        try:
-            # Added timeout (60 seconds, adjust as needed)
-            response = requests.post(API_ENDPOINT, json=payload, timeout=60) 
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            api_result = response.json()
-            
-            print(f"Received raw response for chunk {chunk_num}.")
-            
-            if api_result:
-                print("Cleaning response...")
-                cleaned_data = clean_gemini_output(api_result)
-                if cleaned_data:
-                    print(f"Successfully cleaned response for chunk {chunk_num}.")
-                    # Store the cleaned data along with chunk info
-                    all_results.append({
-                        "chunk_num": chunk_num,
-                        "start_line": start_line + 1,
-                        "end_line": end_line,
-                        "cleaned_data": cleaned_data
-                    })
-                else:
-                    print(f"Error: Cleaning failed for chunk {chunk_num}.")
-                    all_results.append({"chunk_num": chunk_num, "error": "Cleaning failed", "raw_response": api_result})
-            else:
-                 print(f"Error: 'generated_text' key not found or empty in response for chunk {chunk_num}.")
-                 all_results.append({"chunk_num": chunk_num, "error": "Missing generated_text", "raw_response": api_result})
-        
-        except requests.exceptions.Timeout:
-             print(f"Error: Request timed out for chunk {chunk_num}.")
-             all_results.append({"chunk_num": chunk_num, "error": "Request timeout"})
-        except requests.exceptions.RequestException as e:
-            print(f"Error during API request for chunk {chunk_num}: {e}")
-            # Log detailed error if available
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"API Response Status Code: {e.response.status_code}")
-                print(f"API Response Body: {e.response.text}")
-                all_results.append({"chunk_num": chunk_num, "error": str(e), "status_code": e.response.status_code, "response_body": e.response.text})
-            else:
-                all_results.append({"chunk_num": chunk_num, "error": str(e)})
-        except Exception as e:
-            print(f"An unexpected error occurred processing chunk {chunk_num}: {e}")
-            all_results.append({"chunk_num": chunk_num, "error": f"Unexpected error: {str(e)}"})
-
-        print(f"    Waiting {DELAY_BETWEEN_CALLS}s...")
-        time.sleep(DELAY_BETWEEN_CALLS) 
+    print(f"\n--- Processing Chunks ({MAX_CONCURRENT_REQUESTS} concurrent requests) ---")
+    all_results = asyncio.run(_process_all_chunks(text, line_offsets, steps))
 
     # 6. Save all collected results to a single file
     print(f"\n--- Finished Processing All Chunks ({len(all_results)} results collected) ---")
@@ -125,8 +287,8 @@ def chunk_transcript(transcription_file: str) -> Optional[str]:
     output_filename = os.path.basename(transcription_file).replace('.txt', '_gemini_output_chunked_cleaned.json')
     output_path = os.path.join(os.path.dirname(transcription_file), output_filename)
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(all_results, f, ensure_ascii=False, indent=2)
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(all_results, option=JSON_DUMP_OPTIONS))
         print(f"Successfully saved all collected results to: {output_path}")
     except Exception as e:
         print(f"Error saving collected results to {output_path}: {e}")
@@ -135,145 +297,219 @@ def chunk_transcript(transcription_file: str) -> Optional[str]:
 
     return output_path
 
+def _tag_block(block_index: int, block: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Tag one block through the API.
+
+    Args:
+        block_index: 0-based index of the block within its chunk
+        block: The cleaned block with its 'lines'
+
+    Returns:
+        The same block, updated with 'tagging_result' or 'tagging_error' details
+    """
+    block_id = block.get('block_id', block_index + 1)
+    lines = block.get('lines')
+    # The loaded chunk data isn't used after tagging, so tag the block in place instead of copying it
+    processed_block = block
+    
+    logger.debug("Processing block %s", block_id)
+
+    if not lines or not isinstance(lines, list):
+        logger.warning("Missing or invalid 'lines' for block %s. Skipping tagging.", block_id)
+        processed_block['tagging_error'] = "Missing or invalid lines data"
+        return processed_block
+
+    try:
+         tagging_api_prompt = tagging_prompt(processed_block)
+    except Exception as e:
+         logger.error("Error creating prompt for block %s: %s", block_id, e)
+         processed_block['tagging_error'] = f"Prompt creation error: {e}"
+         return processed_block # Skip API call if prompt fails
+
+    # Call API for tagging
+    logger.debug("Sending request for block %s", block_id)
+    try:
+        TAGGING_RATE_LIMITER.acquire()
+        # Blocks with identical prompts share one call, even while it is still in flight
+        api_result = memoized_post(SESSION, API_ENDPOINT, tagging_api_prompt, timeout=API_TIMEOUT)
+        
+        logger.debug("Received raw response for block %s", block_id)
+        
+        if api_result:
+            cleaned_tags = clean_gemini_output(api_result)
+            if cleaned_tags:
+                logger.debug("Successfully cleaned tags for block %s", block_id)
+                processed_block['tagging_result'] = cleaned_tags
+            else:
+                logger.error("Cleaning failed for block %s tags", block_id)
+                processed_block['tagging_error'] = "Tag cleaning failed"
+                processed_block['raw_tagging_response'] = api_result # Store raw if cleaning fails
+        else:
+            logger.error("'generated_text' key not found or empty in tagging response for block %s", block_id)
+            processed_block['tagging_error'] = "Missing generated_text in tagging response"
+            processed_block['raw_tagging_response'] = api_result
+
+    except requests.exceptions.Timeout:
+         logger.error("Request timed out for block %s", block_id)
+         processed_block['tagging_error'] = "API Request timeout"
+    except requests.exceptions.RequestException as e:
+        logger.error("Error during API request for block %s: %s", block_id, e)
+        processed_block['tagging_error'] = f"API Request error: {e}"
+        if hasattr(e, 'response') and e.response is not None:
+             processed_block['tagging_status_code'] = e.response.status_code
+             processed_block['tagging_response_body'] = e.response.text
+    except Exception as e:
+        logger.error("An unexpected error occurred processing block %s: %s", block_id, e)
+        processed_block['tagging_error'] = f"Unexpected processing error: {e}"
+    
+    return processed_block
+
+def _lines_digest(block: Dict[str, Any]) -> str:
+    """Fingerprint a block's lines, so a sidecar entry is only reused for the same block."""
+    return hashlib.blake2b(orjson.dumps(block.get('lines')), digest_size=16).hexdigest()
+
+def _load_tagged_progress(progress_path: str) -> Dict[Tuple[Any, int], Tuple[str, Dict[str, Any]]]:
+    """
+    Read blocks tagged by an earlier, interrupted run from the JSONL sidecar.
+
+    Args:
+        progress_path: Path of the sidecar file
+
+    Returns:
+        Dict mapping (chunk_num, block_index) to the digest of the block's lines and the tagged block
+    """
+    tagged = {}
+    try:
+        with open(progress_path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                    tagged[(entry["chunk_num"], entry["block_index"])] = (entry["lines_digest"], entry["block"])
+                except (orjson.JSONDecodeError, KeyError):
+                    # A crash mid-write can leave a partial last line
+                    continue
+    except FileNotFoundError:
+        pass
+    return tagged
+
 def tag_transcript_chunks(chunked_file_path: str):
-    print(f"--- Starting Tagging Processor ---")
+    logger.info("--- Starting Tagging Processor ---")
 
     # 1. Read the chunked and cleaned input file
     chunk_data = []
     try:
-        with open(chunked_file_path, 'r', encoding='utf-8') as f:
-            chunk_data = json.load(f)
+        with open(chunked_file_path, 'rb') as f:
+            chunk_data = orjson.loads(f.read())
     except FileNotFoundError:
-        print(f"Error: Input file not found at {chunked_file_path}")
+        logger.error("Input file not found at %s", chunked_file_path)
         exit(1)
-    except json.JSONDecodeError as e:
-        print(f"Error: Could not decode JSON from input file {chunked_file_path}. Error: {e}")
+    except orjson.JSONDecodeError as e:
+        logger.error("Could not decode JSON from input file %s: %s", chunked_file_path, e)
         exit(1)
     except Exception as e:
-        print(f"An unexpected error occurred while reading {chunked_file_path}: {e}")
+        logger.error("An unexpected error occurred while reading %s: %s", chunked_file_path, e)
         exit(1)
 
     if not isinstance(chunk_data, list):
-        print(f"Error: Expected input file {chunked_file_path} to contain a JSON list.")
+        logger.error("Expected input file %s to contain a JSON list", chunked_file_path)
         exit(1)
 
-    print(f"Successfully loaded {len(chunk_data)} chunks from input file.")
+    logger.info("Successfully loaded %d chunks from input file", len(chunk_data))
+
+    output_filename = os.path.basename(chunked_file_path).replace('_gemini_output_chunked_cleaned.json', '_tagged.json')
+    output_file_path = os.path.join(os.path.dirname(chunked_file_path), output_filename)
+    # Each tagged block is appended here as it completes, so a rerun resumes where it stopped
+    progress_path = output_file_path + '.jsonl'
+    already_tagged = _load_tagged_progress(progress_path)
+    if already_tagged:
+        logger.info("Resuming: %d blocks already tagged in %s", len(already_tagged), progress_path)
 
     processed_chunk_data = [] # List to store final results with tags
+    # (chunk_num, chunk's processed_blocks list, slot in it, block, lines digest) for every block to tag
+    block_jobs = []
+    # Counted as blocks are seen, so the summary doesn't walk the output again
+    stats = Counter()
 
-    # 2. Iterate through chunks
+    # 2. Iterate through chunks, reserving a slot for each block's result
     for chunk_index, chunk in enumerate(chunk_data):
         chunk_num = chunk.get('chunk_num', chunk_index + 1) # Use index if num missing
-        start_line = chunk.get("start_line", 0)
-        end_line = chunk.get("end_line", 0)
-        
-        print(f"\n--- Processing Chunk {chunk_num} ---")
         
         original_blocks = chunk.get('cleaned_data')
         chunk_error = chunk.get('error')
-        processed_chunk_info= [] # Store results for this chunk's blocks
+        wrapper_object = {
+            "chunk_num": chunk_num,
+            "start_line": chunk.get("start_line", 0),
+            "end_line": chunk.get("end_line", 0),
+            "processed_blocks": []
+        }
+        processed_chunk_data.append(wrapper_object)
         
         if chunk_error:
-             print(f"Skipping chunk {chunk_num} due to previous error: {chunk_error}")
-             processed_chunk_data.append(processed_chunk_info) # Keep error info
+             logger.warning("Skipping chunk %s due to previous error: %s", chunk_num, chunk_error)
+             wrapper_object["error"] = chunk_error # Keep error info
+             stats["skipped_chunks"] += 1
              continue
              
         if not isinstance(original_blocks, list):
-            print(f"Warning: 'cleaned_data' for chunk {chunk_num} is not a list. Skipping blocks.")
-            processed_chunk_data.append(processed_chunk_info)
+            logger.warning("'cleaned_data' for chunk %s is not a list. Skipping blocks.", chunk_num)
+            stats["skipped_chunks"] += 1
             continue
 
-        # 3. Iterate through blocks within the chunk
+        wrapper_object["processed_blocks"] = [None] * len(original_blocks)
         for block_index, block in enumerate(original_blocks):
-            block_id = block.get('block_id', block_index + 1)
-            lines = block.get('lines')
-            processed_block = block.copy() # Keep original block info
-            
-            print(f"  Processing Block {block_id}...")
-
-            if not lines or not isinstance(lines, list):
-                print(f"    Warning: Missing or invalid 'lines' for block {block_id}. Skipping tagging.")
-                processed_block['tagging_error'] = "Missing or invalid lines data"
-                processed_chunk_info['processed_blocks'].append(processed_block)
+            # Blocks are tagged in place, so fingerprint the lines before tagging starts
+            digest = _lines_digest(block) if isinstance(block, dict) else ""
+            done = already_tagged.get((chunk_num, block_index))
+            if done is not None and done[0] == digest:
+                wrapper_object["processed_blocks"][block_index] = done[1]
+                stats["resumed"] += 1
                 continue
-
-            
-            try:
-                 tagging_api_prompt = tagging_prompt(processed_block)
-            except Exception as e:
-                 print(f"    Error creating prompt for block {block_id}: {e}")
-                 processed_block['tagging_error'] = f"Prompt creation error: {e}"
-                 processed_chunk_info['processed_blocks'].append(processed_block)
-                 continue # Skip API call if prompt fails
-                 
-            payload = {"prompt": tagging_api_prompt}
-
-            # 5. Call API for tagging
-            print(f"    Sending request for block {block_id}...")
-            try:
-                response = requests.post(API_ENDPOINT, json=payload, timeout=API_TIMEOUT)
-                response.raise_for_status() 
-                api_result = response.json()
-                
-                print(f"Received raw response for block {block_id}.")
-                
-                if api_result:
-                    print("    Cleaning tagging response...")
-                    cleaned_tags = clean_gemini_output(api_result)
-                    if cleaned_tags:
-                        print(f"    Successfully cleaned tags for block {block_id}.")
-                        processed_block['tagging_result'] = cleaned_tags
-                    else:
-                        print(f"    Error: Cleaning failed for block {block_id} tags.")
-                        processed_block['tagging_error'] = "Tag cleaning failed"
-                        processed_block['raw_tagging_response'] = generated_tags_string # Store raw if cleaning fails
-                else:
-                    print(f"    Error: 'generated_text' key not found or empty in tagging response for block {block_id}.")
-                    processed_block['tagging_error'] = "Missing generated_text in tagging response"
-                    processed_block['raw_tagging_response'] = api_result
-
-            except requests.exceptions.Timeout:
-                 print(f"    Error: Request timed out for block {block_id}.")
-                 processed_block['tagging_error'] = "API Request timeout"
-            except requests.exceptions.RequestException as e:
-                print(f"    Error during API request for block {block_id}: {e}")
-                processed_block['tagging_error'] = f"API Request error: {e}"
-                if hasattr(e, 'response') and e.response is not None:
-                     processed_block['tagging_status_code'] = e.response.status_code
-                     processed_block['tagging_response_body'] = e.response.text
-            except Exception as e:
-                print(f"    An unexpected error occurred processing block {block_id}: {e}")
-                processed_block['tagging_error'] = f"Unexpected processing error: {e}"
-            
-            # Append the processed block (with tags or error) to the chunk's results
-            processed_chunk_info.append(processed_block)
-            
-            # Add delay
-            print(f"    Waiting {DELAY_BETWEEN_CALLS}s...")
-            time.sleep(DELAY_BETWEEN_CALLS)
-            
-        # Add the fully processed chunk info to the final list
-        wrapper_object = {}
-        wrapper_object["chunk_num"] = chunk_num
-        wrapper_object["start_line"] = start_line
-        wrapper_object["end_line"] = end_line
-        wrapper_object["processed_blocks"] = processed_chunk_info
-        processed_chunk_data.append(wrapper_object)
-
-    # 7. Save all collected results to the final output file
-    print(f"\n--- Finished Processing All Blocks ---")
-
-    output_filename = os.path.basename(chunked_file_path).replace('_gemini_output_chunked_cleaned.json', '_tagged.json')
-    output_file_path = os.path.join(os.path.dirname(chunked_file_path), output_filename)
+            if done is not None:
+                logger.warning("Sidecar entry for chunk %s block %s doesn't match the input; retagging it", chunk_num, block_index)
+            block_jobs.append((chunk_num, wrapper_object["processed_blocks"], block_index, block, digest))
+
+    # 3. Tag blocks concurrently; each result goes back into its reserved slot, so order is kept
+    logger.info("Tagging %d blocks with %d workers...", len(block_jobs), TAGGING_WORKERS)
+    with ThreadPoolExecutor(max_workers=TAGGING_WORKERS) as executor, open(progress_path, 'ab') as progress:
+        futures = {
+            executor.submit(_tag_block, block_index, block): (chunk_num, processed_blocks, block_index, digest)
+            for chunk_num, processed_blocks, block_index, block, digest in block_jobs
+        }
+        for future in as_completed(futures):
+            chunk_num, processed_blocks, block_index, digest = futures[future]
+            processed_block = future.result()
+            processed_blocks[block_index] = processed_block
+            # Failed blocks aren't recorded, so a rerun tries them again
+            if 'tagging_error' in processed_block:
+                stats["failed"] += 1
+            else:
+                stats["tagged"] += 1
+                progress.write(orjson.dumps({
+                    "chunk_num": chunk_num,
+                    "block_index": block_index,
+                    "lines_digest": digest,
+                    "block": processed_block
+                }, option=orjson.OPT_NON_STR_KEYS) + b"\n")
+                progress.flush()
+
+    # 4. Save all collected results to the final output file
+    logger.info("--- Finished Processing All Blocks ---")
+    logger.info(
+        "Blocks: %d tagged, %d resumed, %d failed; %d chunks skipped",
+        stats["tagged"], stats["resumed"], stats["failed"], stats["skipped_chunks"]
+    )
 
     try:
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            json.dump(processed_chunk_data, f, ensure_ascii=False, indent=2)
-        print(f"Successfully saved all processed data with tags to: {output_file_path}")
+        with open(output_file_path, 'wb') as f:
+            f.write(orjson.dumps(processed_chunk_data, option=JSON_DUMP_OPTIONS))
+        logger.info("Successfully saved all processed data with tags to: %s", output_file_path)
+        # The final file now holds everything the sidecar did
+        os.remove(progress_path)
     except Exception as e:
-        print(f"Error saving final tagged data to {output_file_path}: {e}")
+        logger.error("Error saving final tagged data to %s: %s", output_file_path, e)
 
-    print("--- Tagging Processor Finished ---") 
+    logger.info("--- Tagging Processor Finished ---")
     return output_file_path
 
 # --- Main Pipeline Function ---
@@ -1,13 +1,22 @@
 
 import os
+import re
+import glob
 from datetime import datetime
 import torch
-import json
+import orjson
 from yt_dlp import YoutubeDL
-import whisper
+from faster_whisper import WhisperModel
 from pyannote.audio import Pipeline as PyAnnotePipeline
 from dotenv import load_dotenv
 import math 
+import bisect
+import threading
+import atexit
+import subprocess
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 
 load_dotenv()
@@ -20,6 +29,13 @@ grand_parent_dir = os.path.dirname(os.path.abspath(current_dir))
 backend_dir = os.path.dirname(os.path.abspath(grand_parent_dir))
 data_dir = os.path.join(backend_dir, "data") 
 LOG_PATH = os.path.join(data_dir, 'log_transcript.json')
+# Keep a copy of the raw Whisper output next to the speaker transcript
+SAVE_WHISPER_JSON = os.getenv("SAVE_WHISPER_JSON", "true").lower() in ("1", "true", "yes")
+# Run diarization under FP16 autocast when it is on CUDA
+DIARIZATION_FP16 = os.getenv("DIARIZATION_FP16", "true").lower() in ("1", "true", "yes")
+# Indent the pipeline's JSON outputs for reading by hand; compact output is smaller and faster to write
+PRETTY_JSON = os.getenv("PRETTY_JSON", "false").lower() in ("1", "true", "yes")
+JSON_DUMP_OPTIONS = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if PRETTY_JSON else 0)
 
 
 # --- helper ---
@@ -39,6 +55,27 @@ def format_timestamp(seconds: float) -> str:
 
     return f"{hours:02d}:{minutes:02d}:{seconds_int:02d}.{milliseconds:03d}"
 
+def format_timestamps(seconds) -> list:
+    """Formats an array of seconds into HH:MM:SS.ms strings; the vectorized format_timestamp."""
+    milliseconds = np.rint(np.asarray(seconds, dtype=np.float64) * 1000.0).astype(np.int64)
+    assert (milliseconds >= 0).all(), "non-negative timestamps expected"
+    hours = milliseconds // 3_600_000
+    minutes = (milliseconds // 60_000) % 60
+    seconds_int = (milliseconds // 1_000) % 60
+    milliseconds = milliseconds % 1_000
+    return [
+        f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+        for h, m, s, ms in zip(hours.tolist(), minutes.tolist(), seconds_int.tolist(), milliseconds.tolist())
+    ]
+
+def _dump_json(data, path):
+    """Writes data to path as JSON; used from a background thread."""
+    try:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=JSON_DUMP_OPTIONS))
+    except Exception as e:
+        print(f"Error saving {path}: {e}")
+
 def progress_hook(d):
     if d['status'] == 'downloading':
         percent = d.get('_percent_str', '').strip()
@@ -50,152 +87,316 @@ def progress_hook(d):
 
 # --- End Helper ---
 
+SAMPLE_RATE = 16000  # Whisper and pyannote both work on 16 kHz mono
+
+_YOUTUBE_ID_RE = re.compile(r"(?:v=|youtu\.be/|shorts/)([A-Za-z0-9_-]{11})")
+
+def _youtube_id(url):
+    """Extracts the video id from a YouTube URL without a metadata request, or returns None."""
+    match = _YOUTUBE_ID_RE.search(url)
+    return match.group(1) if match else None
+
+def _existing_audio(audio_folder, video_id):
+    """Returns a previously downloaded, non-empty audio file for video_id, if any."""
+    for path in glob.glob(os.path.join(audio_folder, f"{glob.escape(video_id)}.*")):
+        if not path.endswith((".part", ".ytdl")) and os.path.getsize(path) > 0:
+            return path
+    return None
+
 def download_audio(url, parent_dir=data_dir):
+    """Downloads the best audio stream as-is and returns the downloaded file's path."""
     audio_folder = os.path.join(parent_dir, 'audio')
     os.makedirs(audio_folder, exist_ok=True)
+
+    # Reuse the audio from an earlier run so restarted batches skip finished downloads
+    video_id = _youtube_id(url)
+    if video_id:
+        existing_path = _existing_audio(audio_folder, video_id)
+        if existing_path:
+            print(f"Audio already downloaded: {existing_path}")
+            return existing_path
     
+    # No WAV extraction: load_audio decodes the original stream once, in memory
     ydl_opts = {
         'format': 'bestaudio/best',
         'outtmpl': f'{audio_folder}/%(id)s.%(ext)s',
         'progress_hooks': [progress_hook],
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'wav',
-            # 'preferredquality': '192',
-        }],
     }
 
     with YoutubeDL(ydl_opts) as ydl:
         info_dict = ydl.extract_info(url, download=True)
-        return os.path.join(audio_folder, f"{info_dict['id']}.wav")
+        return ydl.prepare_filename(info_dict)
+
+def load_audio(audio_path, sample_rate=SAMPLE_RATE):
+    """Decodes an audio file to a mono float32 array in [-1, 1] by piping it through ffmpeg."""
+    pcm = subprocess.run(
+        ["ffmpeg", "-nostdin", "-i", audio_path, "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-"],
+        capture_output=True,
+        check=True
+    ).stdout
+    return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+def build_speaker_index(diarization_result):
+    """
+    Sorts the diarization turns once so segments can be matched by binary search.
 
-def find_speaker_for_segment(start, end, diarization_result):
-    for turn, _, speaker in diarization_result.itertracks(yield_label=True):
-        if turn.start <= start and end <= turn.end:
-            return speaker
+    Returns:
+        (turns, starts, max_ends): turns as sorted (start, end, speaker) tuples, their
+        start times, and the running maximum of their end times
+    """
+    turns = sorted(
+        (turn.start, turn.end, speaker)
+        for turn, _, speaker in diarization_result.itertracks(yield_label=True)
+    )
+    starts = [turn[0] for turn in turns]
+    max_ends = []
+    running_max = float("-inf")
+    for _, turn_end, _ in turns:
+        running_max = max(running_max, turn_end)
+        max_ends.append(running_max)
+    return turns, starts, max_ends
+
+def find_speaker_for_segment(start, end, speaker_index):
+    """Returns the speaker of the first turn (by start time) containing [start, end]."""
+    turns, starts, max_ends = speaker_index
+    # Turns [0, last] start at or before the segment
+    last = bisect.bisect_right(starts, start) - 1
+    # First turn whose end reaches the segment end; max_ends is non-decreasing
+    first = bisect.bisect_left(max_ends, end)
+    if first <= last:
+        return turns[first][2]
     return "UNKNOWN"
 
-def transcribe_youtube_audio(url, parent_dir = data_dir):
-    audio_path = download_audio(url)
-    audio_name = audio_path.split("/")[-1]
-
-    whisper_model = whisper.load_model("base")
-    result = whisper_model.transcribe(audio_path)
-
-    whisper_transcript_folder = os.path.join(parent_dir, 'whisper_transcript')
-    os.makedirs(whisper_transcript_folder, exist_ok=True)
+def _speaker_output_lines(segments, speaker_index):
+    """Yields one "[start --> end] [speaker] text" line per transcript segment."""
+    # Format all timestamps up front in one vectorized pass
+    formatted_starts = format_timestamps([segment['start'] for segment in segments])
+    formatted_ends = format_timestamps([segment['end'] for segment in segments])
 
-    whisper_output_name = audio_name.replace('.wav', '.json')
+    # Combine transcription + speaker + timestamps
+    for segment, formatted_start, formatted_end in zip(segments, formatted_starts, formatted_ends):
+        start = segment['start']
+        end = segment['end']
+        text = segment['text'].strip()
+        
+        # Get speaker
+        speaker = find_speaker_for_segment(start, end, speaker_index)
+        
+        # Create the output line with timestamps
+        yield f"[{formatted_start} --> {formatted_end}] [{speaker}] {text}"
+
+def _transcribe(whisper_model, audio):
+    """Runs Whisper and materializes its lazy segments into the openai-whisper result shape."""
+    segments, info = whisper_model.transcribe(audio, vad_filter=True, beam_size=1)
+    # Decoding happens while iterating, so this runs inside the worker thread
+    return {
+        "language": info.language,
+        "segments": [
+            {"start": segment.start, "end": segment.end, "text": segment.text}
+            for segment in segments
+        ]
+    }
 
-    whisper_output_path = os.path.join(whisper_transcript_folder, whisper_output_name)
+def _diarize(diarization_pipeline, audio, device):
+    """Runs the diarization pipeline on in-memory samples, in FP16 on CUDA when enabled."""
+    waveform = {
+        "waveform": torch.from_numpy(audio).unsqueeze(0),  # (channel, time)
+        "sample_rate": SAMPLE_RATE
+    }
+    if device.type == "cuda" and DIARIZATION_FP16:
+        try:
+            # Segmentation and embedding models are the bulk of the cost; autocast
+            # runs their matmuls/convs in half precision without touching the weights
+            with torch.autocast(device_type="cuda", dtype=torch.float16):
+                return diarization_pipeline(waveform)
+        except Exception as e:
+            print(f"FP16 diarization failed, retrying in FP32: {e}")
+    return diarization_pipeline(waveform)
+
+# Loaded once per process and reused for every URL
+_WHISPER = None
+_DIAR = None
+
+def _models(device):
+    """Returns the Whisper model and the diarization pipeline, loading them on first use."""
+    global _WHISPER, _DIAR
+    if _WHISPER is None:
+        # CTranslate2 backend with int8 weights (int8_float16 activations on CUDA)
+        whisper_device = "cuda" if torch.cuda.is_available() else "cpu"
+        _WHISPER = WhisperModel(
+            "base",
+            device=whisper_device,
+            compute_type="int8_float16" if whisper_device == "cuda" else "int8"
+        )
+        print(f"Whisper model loaded to {whisper_device}")
+    if _DIAR is None:
+        _DIAR = PyAnnotePipeline.from_pretrained(
+            "pyannote/speaker-diarization", use_auth_token= os.getenv("HUGGINGFACE_TOKEN")
+        )
+        # Move the pipeline to the selected device
+        _DIAR.to(device)
+        print(f"Diarization pipeline loaded to {device}")
+    return _WHISPER, _DIAR
 
-    with open(whisper_output_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+def transcribe_youtube_audio(url, parent_dir = data_dir):
+    audio_path = download_audio(url)
+    return transcribe_audio_file(audio_path, parent_dir)
 
-    # with open(whisper_output_path, 'r', encoding='utf-8') as f:
-    #     result = json.load(f)
-    # print("Loaded Whisper transcription from file")
+def transcribe_audio_file(audio_path, parent_dir = data_dir):
+    """Transcribes and diarizes a downloaded audio file; returns the speaker transcript path."""
+    audio_id = os.path.splitext(os.path.basename(audio_path))[0]
+    # Decode once and hand the same samples to both models
+    audio = load_audio(audio_path)
 
     # --- GPU/MPS Check ---
-    if torch.backends.mps.is_available() and torch.backends.mps.is_built():
+    if torch.cuda.is_available():
+        device = torch.device("cuda")
+        print("Using CUDA GPU")
+    elif torch.backends.mps.is_available() and torch.backends.mps.is_built():
         device = torch.device("mps")
         print("Using MPS (Apple Silicon GPU)")
     else:
         device = torch.device("cpu")
-        print("MPS not available, using CPU")
+        print("No GPU available, using CPU")
     # --- End GPU/MPS Check ---
 
-    # Diarization (PyAnnote)
-    diarization_pipeline = PyAnnotePipeline.from_pretrained(
-        "pyannote/speaker-diarization", use_auth_token= os.getenv("HUGGINGFACE_TOKEN")
-    )
-    # Move the pipeline to the selected device
-    diarization_pipeline.to(device)
-    print(f"Diarization pipeline loaded to {device}")
+    whisper_model, diarization_pipeline = _models(device)
 
-    diarization_result = diarization_pipeline(audio_path)
+    # Transcription and diarization are independent and both release the GIL in
+    # their native backends (CTranslate2 on CUDA/CPU, torch on MPS/CPU), so run them together
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        whisper_future = executor.submit(_transcribe, whisper_model, audio)
+        diarization_future = executor.submit(_diarize, diarization_pipeline, audio, device)
+        result = whisper_future.result()
+        diarization_result = diarization_future.result()
 
-    print("done with diarization")
+    print("done with transcription and diarization")
 
-    # Combine transcription + speaker + timestamps
-    speaker_output_lines = []
-    for segment in result['segments']:
-        start = segment['start']
-        end = segment['end']
-        text = segment['text'].strip()
-        
-        # Get speaker
-        speaker = find_speaker_for_segment(start, end, diarization_result)
-        
-        # Format timestamps
-        formatted_start = format_timestamp(start)
-        formatted_end = format_timestamp(end)
-        
-        # Create the output line with timestamps
-        line = f"[{formatted_start} --> {formatted_end}] [{speaker}] {text}"
-        speaker_output_lines.append(line)
+    whisper_transcript_folder = os.path.join(parent_dir, 'whisper_transcript')
+    os.makedirs(whisper_transcript_folder, exist_ok=True)
 
-    print("done with speaker output lines")
+    if SAVE_WHISPER_JSON:
+        whisper_output_name = f"{audio_id}.json"
+        whisper_output_path = os.path.join(whisper_transcript_folder, whisper_output_name)
+        # Write in the background so the speaker merge doesn't wait on serialization;
+        # result is only read from here on
+        threading.Thread(target=_dump_json, args=(result, whisper_output_path)).start()
+
+    speaker_index = build_speaker_index(diarization_result)
 
     speaker_transcript_folder = os.path.join(parent_dir, 'speaker_transcript')
-    os.makedirs(whisper_transcript_folder, exist_ok=True)
+    os.makedirs(speaker_transcript_folder, exist_ok=True)
 
-    speaker_output_name = audio_name.replace('.wav', '.txt')
+    speaker_output_name = f"{audio_id}.txt"
 
     speaker_output_path = os.path.join(speaker_transcript_folder, speaker_output_name)
 
 
+    # Lines are generated while writing instead of being collected first
+    speaker_output_lines = _speaker_output_lines(result['segments'], speaker_index)
     with open(speaker_output_path, 'w') as f:
-        f.write("\n".join(speaker_output_lines))
+        f.write(next(speaker_output_lines, ""))
+        f.writelines("\n" + line for line in speaker_output_lines)
 
-    return speaker_output_path
+    print("done with speaker output lines")
 
-#be very careful with this one
-def log_url_from_file(input_file):
-    """
-    This will be used to keep track of status and number of retries done for multiple link
-    """
+    return speaker_output_path
 
-    with open(input_file, 'r') as f:
-        links = [line.strip() for line in f if line.strip().startswith('https://')]
+# Links downloading at once in log_url_from_file; downloads wait on a bounded queue
+# so they never get far ahead of the single transcription worker
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_QUEUE_SIZE = 2
+
+# Log updates are kept in memory and written every LOG_FLUSH_EVERY links and at exit
+LOG_FLUSH_EVERY = 10
+
+# Guards the logs dicts shared between the download threads and the transcription worker
+_logs_lock = threading.Lock()
+_logs_cache = {}  # log_path -> logs dict, shared by every call in this process
+_unflushed_updates = {}  # log_path -> number of updates not yet written
+# Single background writer so periodic flushes never stall the transcription worker
+_log_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-writer")
+
+def _load_logs(log_path):
+    """Returns the transcription log, reading it from disk on first use."""
+    with _logs_lock:
+        if log_path not in _logs_cache:
+            if os.path.exists(log_path):
+                with open(log_path, 'rb') as f:
+                    _logs_cache[log_path] = orjson.loads(f.read())
+            else:
+                _logs_cache[log_path] = {}
+        return _logs_cache[log_path]
+
+def _flush_logs(log_path):
+    """Writes the transcription log to disk if it has unwritten updates."""
+    with _logs_lock:
+        if not _unflushed_updates.get(log_path):
+            return
+        data = orjson.dumps(_logs_cache[log_path], option=orjson.OPT_INDENT_2)
+        # Replace atomically so an interrupted write never truncates the log
+        tmp_path = f"{log_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, log_path)
+        _unflushed_updates[log_path] = 0
+
+def _flush_all_logs():
+    """Writes every transcription log with pending updates; runs at exit."""
+    for log_path in list(_logs_cache):
+        try:
+            _flush_logs(log_path)
+        except Exception as e:
+            print(f"Error saving transcription log {log_path}: {e}")
+
+atexit.register(_flush_all_logs)
+
+def _flush_logs_in_background(log_path):
+    """Writes the transcription log on the background writer thread."""
+    try:
+        _flush_logs(log_path)
+    except Exception as e:
+        print(f"Error saving transcription log {log_path}: {e}")
 
-    for link in links:
-        log_url(link)
+def _save_logs(logs, log_path):
+    """Records an update to the transcription log, writing it every LOG_FLUSH_EVERY updates."""
+    with _logs_lock:
+        _unflushed_updates[log_path] = _unflushed_updates.get(log_path, 0) + 1
+        flush_due = _unflushed_updates[log_path] >= LOG_FLUSH_EVERY
+    if flush_due:
+        _log_writer.submit(_flush_logs_in_background, log_path)
 
-def log_url(url, log_path=LOG_PATH):
-    """
-    This will be used to keep track of status and number of retries done per link
+def _begin_log_entry(logs, url):
     """
+    Creates the pending log entry for a url.
 
-    # Load or initialize log
-    if os.path.exists(log_path):
-        with open(log_path, 'r') as f:
-            logs = json.load(f)
-    else:
-        logs = {}
-
-    print(f"\Logging: {url}")
-
-    retries =0
-    
-    if url in logs.keys():
-        if logs[url]["status"]=="transcribed":
-            print(f"Transcription was already achieved for {url}")
-            return logs[url]["output_path"]
+    Returns:
+        (log_entry, None) for a url to transcribe, or (None, output_path) if it
+        was already transcribed
+    """
+    retries = 0
+    with _logs_lock:
+        if url in logs:
+            if logs[url]["status"] == "transcribed":
+                print(f"Transcription was already achieved for {url}")
+                return None, logs[url]["output_path"]
 
-        retries = logs[url]["retries"]+1
+            retries = logs[url]["retries"] + 1
 
-    log_entry= {
+    log_entry = {
         "timestamp": datetime.now().isoformat(),
         "status": "pending",
         "error": None,
         "retries": retries
     }
+    return log_entry, None
 
+def _run_logged(logs, url, log_entry, transcribe, log_path):
+    """Runs transcribe(), records the outcome for url and saves the log."""
     is_final = True
 
     try:
-        final_path = transcribe_youtube_audio(url)
+        final_path = transcribe()
         log_entry["status"] = "transcribed"
         log_entry["output_path"] = final_path
         print(f"✅ {url} was transcribed successfully")
@@ -206,9 +407,73 @@ def log_url(url, log_path=LOG_PATH):
         is_final = False
         print(f"❌ Transcription failed for {url}: {e}") 
 
-    # Update and save log after each url
-    logs[url] = log_entry
-    with open(log_path, 'w') as f:
-        json.dump(logs, f, indent=2)
+    # Record the outcome; the log file is written in batches (see LOG_FLUSH_EVERY)
+    with _logs_lock:
+        logs[url] = log_entry
+    _save_logs(logs, log_path)
 
     return final_path if is_final else None
+
+#be very careful with this one
+def log_url_from_file(input_file, log_path=LOG_PATH):
+    """
+    This will be used to keep track of status and number of retries done for multiple link
+
+    Downloads run on a small thread pool and overlap with transcription, which
+    happens one link at a time on the calling thread.
+    """
+
+    with open(input_file, 'r') as f:
+        links = [line.strip() for line in f if line.strip().startswith('https://')]
+    links = list(dict.fromkeys(links))  # Drop duplicates, keep file order
+
+    logs = _load_logs(log_path)
+    pending = {}
+    for link in links:
+        log_entry, _ = _begin_log_entry(logs, link)
+        if log_entry:
+            pending[link] = log_entry
+
+    download_q = queue.Queue(maxsize=DOWNLOAD_QUEUE_SIZE)
+
+    def _download(link):
+        try:
+            download_q.put((link, download_audio(link), None))
+        except Exception as e:
+            download_q.put((link, None, e))
+
+    def _transcribe_downloaded(audio_path, error):
+        if error:
+            raise error
+        return transcribe_audio_file(audio_path)
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as download_pool:
+        for link in pending:
+            download_pool.submit(_download, link)
+
+        for _ in range(len(pending)):
+            link, audio_path, error = download_q.get()
+            print(f"\Logging: {link}")
+            _run_logged(
+                logs, link, pending[link],
+                lambda: _transcribe_downloaded(audio_path, error),
+                log_path
+            )
+
+    _flush_logs(log_path)
+
+def log_url(url, log_path=LOG_PATH):
+    """
+    This will be used to keep track of status and number of retries done per link
+    """
+
+    # Load or initialize log
+    logs = _load_logs(log_path)
+
+    print(f"\Logging: {url}")
+
+    log_entry, output_path = _begin_log_entry(logs, url)
+    if not log_entry:
+        return output_path
+
+    return _run_logged(logs, url, log_entry, lambda: transcribe_youtube_audio(url), log_path)
@@ -10,7 +10,10 @@ from backend.app.services.scenarios import (
     create_scenario,
     get_scenario,
     add_conversation_message,
+    add_conversation_messages,
     get_conversation_history,
+    get_formatted_history,
+    get_turn_embeddings,
     generate_scenario_id,
     flush_conversation_to_s3,
     save_assessment_to_s3
@@ -19,7 +22,9 @@ from backend.app.services.scenarios import (
 # Import and expose chat services
 from backend.app.services.chat import (
     format_chat_prompt,
-    process_chat
+    build_chat_prompt,
+    process_chat,
+    stream_chat
 )
 
 # Import and expose assessment services
@@ -36,8 +41,14 @@ from backend.app.services.vector_store import (
     initialize_embedding_model,
     initialize_qdrant_client,
     get_or_create_collection,
+    begin_bulk_ingest,
+    finalize_ingest,
     generate_embedding,
+    generate_embeddings,
+    build_query_text,
     store_document,
+    flush_documents,
+    flush_all_documents,
     process_and_store_blocks,
     retrieve_relevant_examples
 )
@@ -45,6 +56,12 @@ from backend.app.services.vector_store import (
 # Import VectorService class
 from backend.app.services.vector_service import VectorService
 
+# Import Gemini helpers
+from backend.app.services.gemini import ConcurrencyLimitedModel
+
+# Import ResponseCache class
+from backend.app.services.response_cache import ResponseCache
+
 
 # Export all services for simplified imports
 __all__ = [
@@ -52,12 +69,17 @@ __all__ = [
     'create_scenario',
     'get_scenario',
     'add_conversation_message',
+    'add_conversation_messages',
     'get_conversation_history',
+    'get_formatted_history',
+    'get_turn_embeddings',
     'generate_scenario_id',
     
     # Chat services
     'format_chat_prompt',
+    'build_chat_prompt',
     'process_chat',
+    'stream_chat',
     
     # Assessment services
     'generate_conversation_assessment',
@@ -70,9 +92,17 @@ __all__ = [
     'initialize_embedding_model',
     'initialize_qdrant_client',
     'get_or_create_collection',
+    'begin_bulk_ingest',
+    'finalize_ingest',
     'generate_embedding',
+    'generate_embeddings',
+    'build_query_text',
     'store_document',
+    'flush_documents',
+    'flush_all_documents',
     'process_and_store_blocks',
     'retrieve_relevant_examples',
-    'VectorService'
+    'VectorService',
+    'ResponseCache',
+    'ConcurrencyLimitedModel'
 ]
@@ -1,23 +1,45 @@
-import json
 import os
-from typing import Dict, List, Any, Optional
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
 from backend.app.core import settings
 from backend.app.utils.cleaner import clean_gemini_output
 from backend.data.prompts.prompts import assessment_prompt
-from backend.data import load_archetypes_async
+from backend.data import load_archetypes, load_archetypes_async
 
 async def load_archetypes_data():
     """Load archetypes data from the JSON file."""
     return await load_archetypes_async(settings.ARCHETYPES_FILE)
 
+@lru_cache(maxsize=1)
+def _archetypes_bundle(file_path: str, mtime: float) -> Tuple[str, str]:
+    """
+    Render the archetype definitions and conversation aspects for the assessment prompt.
+    
+    Cached per file path and modification time, so edits to the file are picked up.
+    
+    Returns:
+        Tuple of (formatted archetype definitions, formatted conversation aspects)
+    """
+    archetypes_data = load_archetypes(file_path)
+    user_archetypes = archetypes_data.get('user_archetypes', {})
+    formatted_archetypes_definitions = "\n".join(
+        f"- {name}: {desc}" for name, desc in user_archetypes.items()
+    )
+    conv_aspects = archetypes_data.get('conversation_aspects', {})
+    formatted_conversation_aspects = "\n".join(
+        f"- {name}: {details.get('description', '')}\n    - Good: {details.get('good', '')}\n    - Bad: {details.get('bad', '')}"
+        for name, details in conv_aspects.items()
+    )
+    return formatted_archetypes_definitions, formatted_conversation_aspects
+
+def get_archetypes_bundle() -> Tuple[str, str]:
+    """Return the cached (archetype definitions, conversation aspects) strings."""
+    return _archetypes_bundle(settings.ARCHETYPES_FILE, os.path.getmtime(settings.ARCHETYPES_FILE))
+
 async def load_archetype_definitions():
     """Load archetype definitions from archetypes.json"""
     try:
-        archetypes_data = await load_archetypes_data()
-        user_archetypes = archetypes_data.get('user_archetypes', {})
-        formatted_archetypes_definitions = "\n".join([
-            f"- {name}: {desc}" for name, desc in user_archetypes.items()
-        ])
+        formatted_archetypes_definitions, _ = get_archetypes_bundle()
         return formatted_archetypes_definitions
     except Exception as e:
         print(f"Error loading archetype definitions: {e}")
@@ -26,12 +48,7 @@ async def load_archetype_definitions():
 async def load_conversation_aspects():
     """Load conversation aspects from archetypes.json"""
     try:
-        archetypes_data = await load_archetypes_data()
-        conv_aspects = archetypes_data.get('conversation_aspects', {})
-        formatted_conversation_aspects = "\n".join([
-            f"- {name}: {details.get('description', '')}\n    - Good: {details.get('good', '')}\n    - Bad: {details.get('bad', '')}"
-            for name, details in conv_aspects.items()
-        ])
+        _, formatted_conversation_aspects = get_archetypes_bundle()
         return formatted_conversation_aspects
     except Exception as e:
         print(f"Error loading conversation aspects: {e}")
@@ -54,10 +71,10 @@ async def format_assessment_prompt(
     try:
         
         # Format the conversation history
-        formatted_history_str = "\n".join([
+        formatted_history_str = "\n".join(
             f"{turn.get('role', 'unknown')}: {turn.get('content', '')}" 
             for turn in conversation_history
-        ])
+        )
         
         # Get formatted archetype definitions and conversation aspects
         formatted_archetypes_definitions = await load_archetype_definitions()
@@ -118,7 +135,9 @@ async def generate_conversation_assessment(
         
         return {
             "assessment": assessment_json,
-            "status": "success"
+            "status": "success",
+            # Kept so callers can fall back to it if the JSON fails validation
+            "raw_text_response": generated_text
         }
     except Exception as e:
         return {
@@ -1,14 +1,40 @@
-import json
-from typing import Dict, List, Any, Optional
+import os
+import orjson
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Mapping, Tuple, AsyncIterator
 from backend.app.core import settings
 from backend.app.utils.cleaner import clean_gemini_output
 from backend.data.prompts.prompts import main_convo_prompt
+from backend.data import load_archetypes
+from backend.app.services.scenarios import format_turn
+
+DEFAULT_ROAST_LEVEL_PROFILE = "Cute little roast attempts. Think 'Did I say that out loud?' followed by nervous giggling. Still loves you."
+
+@lru_cache(maxsize=1)
+def _roast_profiles(file_path: str, mtime: float) -> Mapping[Tuple[str, str], str]:
+    """
+    Flatten the roast scale into a read-only (archetype, roast level) -> profile map.
+    
+    Cached per file path and modification time, so edits to the file are picked up.
+    """
+    roast_scale = load_archetypes(file_path).get('roast_scale_profile', {})
+    return MappingProxyType({
+        (archetype, str(level)): profile
+        for archetype, levels in roast_scale.items()
+        for level, profile in levels.items()
+    })
+
+def get_roast_profiles() -> Mapping[Tuple[str, str], str]:
+    """Return the cached (archetype, roast level) -> profile map."""
+    return _roast_profiles(settings.ARCHETYPES_FILE, os.path.getmtime(settings.ARCHETYPES_FILE))
 
 async def format_chat_prompt(
     user_input: str,
     conversation_history: List[Dict[str, str]],
     scenario_data: Dict[str, Any],
-    retrieved_examples: Dict[str, Any]
+    retrieved_examples: Dict[str, Any],
+    formatted_history: Optional[str] = None
 ) -> str:
     """
     Format the chat prompt with user input, conversation history, scenario data, and retrieved examples.
@@ -17,27 +43,31 @@ async def format_chat_prompt(
         user_input: The current user input
         conversation_history: The conversation history before this message
         scenario_data: The scenario data
-        retrieved_examples: Examples retrieved from vector store
+        retrieved_examples: Examples retrieved from vector store, as parallel
+            "metadatas" and "documents" lists
+        formatted_history: Optional history already formatted by the scenario store;
+            built from conversation_history when omitted
         
     Returns:
         Formatted chat prompt
     """
     try:
-        formatted_history = "\n".join([
-            f"{turn.get('role', 'unknown')}: {turn.get('content', '')}" 
-            for turn in conversation_history
-        ])
+        if formatted_history is None:
+            formatted_history = "\n".join(format_turn(turn) for turn in conversation_history)
         
-        # Format retrieved examples for prompt
-        formatted_examples = json.dumps(retrieved_examples, indent=2)
+        # Format retrieved examples for prompt, pairing the columns without building per-example dicts
+        formatted_examples = "\n".join(
+            f"- {orjson.dumps(metadata).decode()}: {document}"
+            for metadata, document in zip(
+                retrieved_examples.get("metadatas", []),
+                retrieved_examples.get("documents", [])
+            )
+        )
         
         # Load roast scale
-        roast_scale = {}
+        roast_profiles = {}
         try:
-            archetypes_path = settings.ARCHETYPES_FILE
-            with open(archetypes_path, 'r', encoding='utf-8') as f:
-                archetypes_data = json.load(f)
-                roast_scale = archetypes_data.get('roast_scale_profile', {})
+            roast_profiles = get_roast_profiles()
         except Exception as e:
             print(f"Warning: Error loading roast scale: {e}")
         
@@ -45,10 +75,8 @@ async def format_chat_prompt(
         roast_level = scenario_data.get('roast_level', 'N/A')
         system_archetype = scenario_data.get('system_archetype', 'N/A')
         
-        # Get roast level profile
-        roast_level_profile = "Cute little roast attempts. Think 'Did I say that out loud?' followed by nervous giggling. Still loves you."
-        if system_archetype in roast_scale and str(roast_level) in roast_scale.get(system_archetype, {}):
-            roast_level_profile = roast_scale[system_archetype][str(roast_level)]
+        # Get roast level profile with a single lookup
+        roast_level_profile = roast_profiles.get((system_archetype, str(roast_level)), DEFAULT_ROAST_LEVEL_PROFILE)
         
         # Create information dictionary for the chat prompt
         information = {
@@ -71,13 +99,95 @@ async def format_chat_prompt(
         print(f"Error formatting chat prompt: {e}")
         raise ValueError(f"Failed to format chat prompt: {str(e)}")
 
+def _example_columns(retrieved: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Extract parallel metadata and document columns from a retrieval result.
+    
+    Accepts the flat Qdrant shape returned by retrieve_relevant_examples
+    ("payloads"/"documents") as well as the nested per-query shape
+    ("metadatas"/"documents").
+    
+    Args:
+        retrieved: The retrieval result
+        
+    Returns:
+        Tuple of (metadatas, documents), empty if the columns don't line up
+    """
+    if "payloads" in retrieved:
+        # The payload's "text" is the document itself, so leave it out of the metadata
+        metadatas = [
+            {key: value for key, value in payload.items() if key != "text"}
+            for payload in retrieved.get("payloads") or []
+        ]
+        documents = retrieved.get("documents") or []
+    else:
+        metadatas = (retrieved.get("metadatas") or [[]])[0]
+        documents = (retrieved.get("documents") or [[]])[0]
+    
+    if not isinstance(metadatas, list) or not isinstance(documents, list) or len(metadatas) != len(documents):
+        return [], []
+    return metadatas, documents
+
+async def build_chat_prompt(
+    user_input: str,
+    scenario_id: str,
+    scenario_data: Dict[str, Any],
+    conversation_history: List[Dict[str, str]],
+    vector_service=None,
+    formatted_history: Optional[str] = None
+) -> str:
+    """
+    Retrieve examples and build the final chat prompt for a message.
+    
+    Args:
+        user_input: The user's input text
+        scenario_id: The scenario ID
+        scenario_data: The scenario data
+        conversation_history: The conversation history
+        vector_service: Optional service for vector retrieval
+        formatted_history: Optional preformatted conversation history
+        
+    Returns:
+        The final prompt to send to the model
+    """
+    # Retrieve examples from vector store if available
+    retrieved_examples = {"metadatas": [], "documents": []}
+    if vector_service:
+        try:
+            print(f"Retrieving relevant examples for scenario: {scenario_id}")
+            retrieved_examples_raw = await vector_service.retrieve_relevant_examples(
+                user_input=user_input,
+                conversation_history=conversation_history,
+                scenario=scenario_data,
+                n_results=5
+            )
+            
+            # Keep the result columnar (parallel lists) for the prompt
+            if retrieved_examples_raw:
+                metadatas, documents = _example_columns(retrieved_examples_raw)
+                retrieved_examples = {"metadatas": metadatas, "documents": documents}
+        except Exception as e:
+            print(f"Error retrieving examples: {e}")
+            # Continue without examples if retrieval fails
+    
+    # Format the chat prompt
+    return await format_chat_prompt(
+        user_input=user_input,
+        conversation_history=conversation_history,
+        scenario_data=scenario_data,
+        retrieved_examples=retrieved_examples,
+        formatted_history=formatted_history
+    )
+
 async def process_chat(
     user_input: str,
     scenario_id: str,
     scenario_data: Dict[str, Any],
     conversation_history: List[Dict[str, str]],
     chat_model,
-    vector_service=None
+    vector_service=None,
+    response_cache=None,
+    formatted_history: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Process a chat message using the AI model.
@@ -89,55 +199,33 @@ async def process_chat(
         conversation_history: The conversation history
         chat_model: The AI chat model
         vector_service: Optional service for vector retrieval
+        response_cache: Optional ResponseCache consulted before calling the model
+        formatted_history: Optional preformatted conversation history
         
     Returns:
         Dict with AI response and status
     """
     try:
-        # Retrieve examples from vector store if available
-        retrieved_examples = []
-        if vector_service:
-            try:
-                print(f"Retrieving relevant examples for scenario: {scenario_id}")
-                retrieved_examples_raw = await vector_service.retrieve_relevant_examples(
-                    user_input=user_input,
-                    conversation_history=conversation_history,
-                    scenario=scenario_data,
-                    n_results=5
-                )
-                
-                # Format retrieved examples
-                if retrieved_examples_raw:
-                    ids = retrieved_examples_raw.get("ids", [[]])
-                    metadatas = retrieved_examples_raw.get("metadatas", [[]])
-                    documents = retrieved_examples_raw.get("documents", [[]])
-                    
-                    if ids and isinstance(ids, list) and ids[0] and \
-                    metadatas and isinstance(metadatas, list) and metadatas[0] and \
-                    documents and isinstance(documents, list) and documents[0]:
-                        num_results = len(ids[0])
-                        if len(metadatas[0]) == num_results and len(documents[0]) == num_results:
-                            for i in range(num_results):
-                                retrieved_examples.append({
-                                    "metadata": metadatas[0][i],
-                                    "document": documents[0][i]
-                                })
-            except Exception as e:
-                print(f"Error retrieving examples: {e}")
-                # Continue without examples if retrieval fails
-        
-        # Format the chat prompt
-        final_prompt = await format_chat_prompt(
+        final_prompt = await build_chat_prompt(
             user_input=user_input,
-            conversation_history=conversation_history,
+            scenario_id=scenario_id,
             scenario_data=scenario_data,
-            retrieved_examples=retrieved_examples
+            conversation_history=conversation_history,
+            vector_service=vector_service,
+            formatted_history=formatted_history
         )
         
         # Generate response using the AI model
         print(f"Sending final prompt to AI for scenario: {scenario_id}")
-        response = await chat_model.generate_content_async(final_prompt)
-        ai_response_text = response.text
+        if response_cache:
+            ai_response_text = await response_cache.generate(
+                chat_model,
+                final_prompt,
+                scope=response_cache.scope_key(scenario_id, user_input)
+            )
+        else:
+            response = await chat_model.generate_content_async(final_prompt)
+            ai_response_text = response.text
         print(f"Received AI response for scenario: {scenario_id}")
         
         return {
@@ -149,4 +237,26 @@ async def process_chat(
         return {
             "error": f"Error processing chat: {str(e)}",
             "status": "error"
-        } 
\ No newline at end of file
+        }
+
+async def stream_chat(chat_model, final_prompt: str) -> AsyncIterator[str]:
+    """
+    Stream the model's response to a prompt as text chunks arrive.
+    
+    Args:
+        chat_model: The AI chat model
+        final_prompt: The prompt built by build_chat_prompt
+        
+    Yields:
+        Response text chunks in order
+    """
+    response = await chat_model.generate_content_async(final_prompt, stream=True)
+    try:
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    finally:
+        # Frees the model's concurrency slot if the client stopped reading early
+        aclose = getattr(response, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,162 @@
+import asyncio
+from typing import List, Optional
+import httpx
+from backend.app.core import settings
+
+GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+class AsyncGeminiEmbedder:
+    """Embeds texts through the Gemini REST batch endpoint over a shared HTTP/2 client."""
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = settings.EMBEDDING_MODEL_NAME,
+        max_concurrency: int = settings.GEMINI_EMBED_CONCURRENCY,
+        task_type: str = "RETRIEVAL_QUERY"
+    ):
+        """
+        Initialize the embedder.
+
+        Args:
+            api_key: The Gemini API key
+            model_name: Embedding model name, with or without the "models/" prefix
+            max_concurrency: Maximum number of embed requests in flight at once
+            task_type: Gemini task type; matches the one used for stored blocks
+        """
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self.task_type = task_type
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # HTTP/2 multiplexes concurrent requests over one connection
+        self._client = httpx.AsyncClient(
+            base_url=GEMINI_API_BASE_URL,
+            headers={"x-goog-api-key": api_key},
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            timeout=30.0
+        )
+
+    async def embed_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """
+        Embed several texts with a single batchEmbedContents request.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List of embeddings aligned with texts, or None if the request fails
+        """
+        if not texts:
+            return []
+
+        payload = {
+            "requests": [
+                {
+                    "model": self.model_name,
+                    "content": {"parts": [{"text": text}]},
+                    "taskType": self.task_type
+                }
+                for text in texts
+            ]
+        }
+        try:
+            async with self._semaphore:
+                response = await self._client.post(f"/{self.model_name}:batchEmbedContents", json=payload)
+            response.raise_for_status()
+            return [embedding["values"] for embedding in response.json()["embeddings"]]
+        except Exception as e:
+            print(f"Error generating embeddings for batch of {len(texts)} texts (model: {self.model_name}): {e}")
+            return None
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        """
+        Embed a single text.
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            List of embedding values or None if generation fails
+        """
+        embeddings = await self.embed_batch([text])
+        return embeddings[0] if embeddings else None
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client."""
+        await self._client.aclose()
+
+class EmbeddingBatcher:
+    """Coalesces embed calls arriving within a short window into one batch request."""
+
+    def __init__(
+        self,
+        embedder: AsyncGeminiEmbedder,
+        max_wait_ms: int = settings.GEMINI_EMBED_BATCH_WINDOW_MS,
+        max_items: int = settings.GEMINI_EMBED_BATCH_SIZE
+    ):
+        """
+        Initialize the batcher. Call start() from a running event loop before use.
+
+        Args:
+            embedder: The embedder that sends the batched requests
+            max_wait_ms: How long the first queued text waits for others to join its batch
+            max_items: Maximum number of texts per batch request
+        """
+        self.embedder = embedder
+        self.max_wait = max_wait_ms / 1000
+        self.max_items = max_items
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight = set()
+
+    def start(self) -> None:
+        """Start the background task that drains the queue."""
+        self._task = asyncio.create_task(self._run())
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        """
+        Embed a single text as part of the next batch.
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            List of embedding values or None if generation fails
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            items = [await self._queue.get()]
+            # Give concurrent requests a moment to join, then take whatever is queued
+            await asyncio.sleep(self.max_wait)
+            while len(items) < self.max_items and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            # Send without awaiting so the next batch can form during this round trip
+            task = asyncio.create_task(self._embed_items(items))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _embed_items(self, items) -> None:
+        try:
+            embeddings = await self.embedder.embed_batch([text for text, _ in items])
+        except Exception as e:
+            print(f"Error embedding batch of {len(items)} texts: {e}")
+            embeddings = None
+        for index, (_, future) in enumerate(items):
+            if not future.done():
+                future.set_result(embeddings[index] if embeddings else None)
+
+    async def aclose(self) -> None:
+        """Stop batching, finish in-flight batches and close the underlying embedder."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        await self.embedder.aclose()
@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+from typing import Dict
+from backend.app.core import settings
+
+class _SlotHoldingStream:
+    """A streamed response that keeps its concurrency slot until it is read to the end or closed."""
+
+    def __init__(self, response, semaphore: asyncio.Semaphore):
+        self._response = response
+        self._semaphore = semaphore
+        self._released = False
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self._semaphore.release()
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._response:
+                yield chunk
+        finally:
+            self._release()
+
+    async def aclose(self):
+        """Releases the slot without reading the rest of the stream."""
+        self._release()
+
+    def __del__(self):
+        # A stream dropped without being read or closed must not leak its slot
+        self._release()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+class ConcurrencyLimitedModel:
+    """
+    Wraps a Gemini model so at most N generate calls are in flight per process.
+
+    Identical prompts that arrive while the first is still in flight share its
+    result instead of triggering another model call.
+    """
+
+    def __init__(self, model, semaphore: asyncio.Semaphore, single_flight: bool = settings.GEMINI_SINGLE_FLIGHT):
+        """
+        Initialize the wrapper.
+
+        Args:
+            model: The genai.GenerativeModel to wrap
+            semaphore: Semaphore shared by every caller of the model
+            single_flight: Whether concurrent identical prompts share one call
+        """
+        self.model = model
+        self.semaphore = semaphore
+        self.single_flight = single_flight
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def _generate(self, *args, **kwargs):
+        if not kwargs.get("stream"):
+            async with self.semaphore:
+                return await self.model.generate_content_async(*args, **kwargs)
+
+        # The call returns before any chunk is read, so the slot goes with the stream
+        await self.semaphore.acquire()
+        try:
+            response = await self.model.generate_content_async(*args, **kwargs)
+        except BaseException:
+            self.semaphore.release()
+            raise
+        return _SlotHoldingStream(response, self.semaphore)
+
+    async def generate_content_async(self, *args, **kwargs):
+        """Awaits the wrapped model's generate_content_async once a slot is free."""
+        # Only plain text prompts are coalesced; streaming and configured calls go straight through
+        if not self.single_flight or kwargs or len(args) != 1 or not isinstance(args[0], str):
+            return await self._generate(*args, **kwargs)
+
+        key = hashlib.blake2b(args[0].encode("utf-8"), digest_size=16).hexdigest()
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._generate(args[0]))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded so one caller disconnecting doesn't cancel the call for the others
+        return await asyncio.shield(future)
+
+    def __getattr__(self, name):
+        # Everything else (model_name, sync generate_content, ...) goes to the wrapped model
+        return getattr(self.model, name)
@@ -0,0 +1,163 @@
+import time
+import uuid
+import hashlib
+import asyncio
+from typing import List, Optional
+from qdrant_client.http import models
+from backend.app.core import settings
+
+class ResponseCache:
+    """Semantic cache of model responses, keyed on the embedding of the final prompt and an optional scope."""
+
+    def __init__(
+        self,
+        qdrant_client,
+        collection_name: str = settings.RESPONSE_CACHE_COLLECTION,
+        embedder=None,
+        min_score: float = settings.RESPONSE_CACHE_MIN_SCORE,
+        ttl_seconds: int = settings.RESPONSE_CACHE_TTL_SECONDS
+    ):
+        """
+        Initialize the response cache.
+
+        Args:
+            qdrant_client: The Qdrant client holding the cache collection
+            collection_name: Name of the cache collection (cosine distance)
+            embedder: Optional AsyncGeminiEmbedder; falls back to the sync SDK in a thread
+            min_score: Minimum cosine similarity for a hit (0.95 is a cosine distance of 0.05)
+            ttl_seconds: Maximum age of a cached response
+        """
+        self.qdrant_client = qdrant_client
+        self.collection_name = collection_name
+        self.embedder = embedder
+        self.min_score = min_score
+        self.ttl_seconds = ttl_seconds
+
+    async def embed_prompt(self, prompt: str) -> Optional[List[float]]:
+        """
+        Embed a prompt for cache lookup and storage.
+
+        Args:
+            prompt: The final prompt sent to the model
+
+        Returns:
+            List of embedding values or None if generation fails
+        """
+        if self.embedder:
+            return await self.embedder.embed(prompt)
+
+        from backend.app.services.vector_store import generate_embedding
+        return await asyncio.to_thread(generate_embedding, prompt)
+
+    @staticmethod
+    def scope_key(scenario_id: str, user_input: str) -> str:
+        """
+        Build the scope a chat response is cached under.
+
+        Prompts from different conversations, or from later turns of the same one, can be
+        near-identical, so a hit must also match the scenario and the current user message.
+
+        Args:
+            scenario_id: The scenario ID
+            user_input: The current user input
+
+        Returns:
+            Hex digest of the scenario ID and user input
+        """
+        return hashlib.blake2b(f"{scenario_id}\n{user_input}".encode(), digest_size=16).hexdigest()
+
+    async def lookup(self, prompt_embedding: List[float], scope: Optional[str] = None) -> Optional[str]:
+        """
+        Find a fresh cached response for a near-identical prompt.
+
+        Args:
+            prompt_embedding: Embedding of the final prompt
+            scope: Optional scope (see scope_key) the cached response must have been stored under
+
+        Returns:
+            The cached response text, or None on a miss
+        """
+        if not prompt_embedding:
+            return None
+
+        # Entries older than the TTL are ignored rather than deleted on the request path
+        conditions = [
+            models.FieldCondition(
+                key="created_at",
+                range=models.Range(gte=time.time() - self.ttl_seconds)
+            )
+        ]
+        if scope:
+            conditions.append(models.FieldCondition(key="scope", match=models.MatchValue(value=scope)))
+        freshness_filter = models.Filter(must=conditions)
+        try:
+            results = await asyncio.to_thread(
+                self.qdrant_client.search,
+                collection_name=self.collection_name,
+                query_vector=prompt_embedding,
+                limit=1,
+                query_filter=freshness_filter,
+                score_threshold=self.min_score,
+                with_payload=True
+            )
+            if results:
+                return results[0].payload.get("response")
+            return None
+        except Exception as e:
+            print(f"Error looking up response cache: {e}")
+            return None
+
+    async def store(self, prompt_embedding: List[float], response_text: str, scope: Optional[str] = None) -> bool:
+        """
+        Cache a model response under its prompt embedding.
+
+        Args:
+            prompt_embedding: Embedding of the final prompt
+            response_text: The model's response
+            scope: Optional scope (see scope_key) stored with the response
+
+        Returns:
+            True if the response was cached, False otherwise
+        """
+        if not prompt_embedding or not response_text:
+            return False
+
+        payload = {"response": response_text, "created_at": time.time()}
+        if scope:
+            payload["scope"] = scope
+        try:
+            await asyncio.to_thread(
+                self.qdrant_client.upsert,
+                collection_name=self.collection_name,
+                points=[models.PointStruct(
+                    id=str(uuid.uuid4()),
+                    vector=prompt_embedding,
+                    payload=payload
+                )]
+            )
+            return True
+        except Exception as e:
+            print(f"Error storing response in cache: {e}")
+            return False
+
+    async def generate(self, chat_model, prompt: str, scope: Optional[str] = None) -> str:
+        """
+        Return a cached response for the prompt, or generate and cache a new one.
+
+        Args:
+            chat_model: The AI chat model
+            prompt: The final prompt
+            scope: Optional scope (see scope_key) that limits hits to the same conversation turn
+
+        Returns:
+            The response text
+        """
+        prompt_embedding = await self.embed_prompt(prompt)
+        cached = await self.lookup(prompt_embedding, scope)
+        if cached is not None:
+            print("Response cache hit.")
+            return cached
+
+        response = await chat_model.generate_content_async(prompt)
+        await self.store(prompt_embedding, response.text, scope)
+        return response.text
@@ -1,7 +1,11 @@
-import uuid
+import os
 import time
-import json
+import secrets
+import orjson
 import boto3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 from backend.app.core import settings
 
@@ -10,14 +14,41 @@ s3 = boto3.client("s3")
 BUCKET_NAME = settings.aws_bucket_name  
 SCENARIO_PREFIX = "scenario"
 
-# In-memory storage (replace with database in production)
+# In-memory storage, used when REDIS_URL is not set
 scenarios_db: Dict[str, Any] = {}
 
+def _init_redis():
+    """Connect to Redis through a shared connection pool, or return None to use memory."""
+    if not settings.REDIS_URL:
+        return None
+    try:
+        import redis
+        
+        pool = redis.ConnectionPool.from_url(settings.REDIS_URL, max_connections=settings.REDIS_MAX_CONNECTIONS)
+        return redis.Redis(connection_pool=pool)
+    except Exception as e:
+        print(f"Error initializing Redis, falling back to in-memory scenarios: {e}")
+        return None
+
+# Shared by every worker, so the API can run with more than one Uvicorn worker
+redis_client = _init_redis()
+
+# Per-process turn embeddings for Redis-backed scenarios, least recently used first
+_turn_embedding_cache: "OrderedDict[str, List[List[float]]]" = OrderedDict()
+# Route handlers reach the cache from asyncio.to_thread workers
+_turn_embedding_cache_lock = threading.Lock()
+
+def _scenario_key(scenario_id: str) -> str:
+    return f"scn:{scenario_id}"
+
+def _history_key(scenario_id: str) -> str:
+    return f"scn:{scenario_id}:hist"
+
 def generate_scenario_id() -> str:
-    """Generate a unique scenario ID."""
-    timestamp = int(time.time())
-    unique_uuid = uuid.uuid4()
-    return f"conversation-{timestamp}-{unique_uuid}"
+    """Generate a unique, time-ordered scenario ID."""
+    # Millisecond prefix keeps IDs (and Redis/S3 keys) sorted by creation time;
+    # 64 random bits make collisions within the same millisecond negligible
+    return f"conversation-{time.time_ns() // 1_000_000}-{secrets.token_hex(8)}"
 
 def _s3_key(suffix: str, scenario_id: str) -> str:
     return f"{SCENARIO_PREFIX}/{scenario_id}_{suffix}.json"
@@ -38,14 +69,21 @@ def create_scenario(scenario_data: Dict[str, Any]) -> str:
     s3.put_object(
         Bucket=BUCKET_NAME,
         Key=_s3_key("scenarioData", scenario_id),
-        Body=json.dumps(scenario_data),
+        Body=orjson.dumps(scenario_data),
         ContentType="application/json"
     )
 
-    # Store in memory (replace with database in production)
+    if redis_client:
+        # History lives in its own list so each turn is a single RPUSH
+        redis_client.set(_scenario_key(scenario_id), orjson.dumps(scenario_data))
+        return scenario_id
+    
+    # Store in memory
     scenarios_db[scenario_id] = {
         "scenario_data": scenario_data,
-        "conversation_history": []
+        "conversation_history": [],
+        "formatted_history": [],
+        "turn_embeddings": []
     }
     
     return scenario_id
@@ -60,6 +98,10 @@ def get_scenario(scenario_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         The scenario data or None if not found
     """
+    if redis_client:
+        raw = redis_client.get(_scenario_key(scenario_id))
+        return orjson.loads(raw) if raw else None
+    
     scenario_container = scenarios_db.get(scenario_id)
     
     if not scenario_container or "scenario_data" not in scenario_container:
@@ -67,6 +109,38 @@ def get_scenario(scenario_id: str) -> Optional[Dict[str, Any]]:
     
     return scenario_container["scenario_data"]
 
+def format_turn(message: Dict[str, Any]) -> str:
+    """Formats one conversation turn as a line of the chat prompt's history."""
+    return f"{message.get('role', 'unknown')}: {message.get('content', '')}"
+
+def _synced_formatted_history(scenario_container: Dict[str, Any]) -> List[str]:
+    """Returns the container's formatted turns, rebuilt from the raw history if the two have drifted apart."""
+    history = scenario_container.setdefault("conversation_history", [])
+    formatted = scenario_container.get("formatted_history")
+    if formatted is None or len(formatted) != len(history):
+        formatted = scenario_container["formatted_history"] = [format_turn(message) for message in history]
+    return formatted
+
+@lru_cache(maxsize=None)
+def _ensure_log_dir(log_dir: str) -> None:
+    """Creates the turn log directory the first time it is used."""
+    os.makedirs(log_dir, exist_ok=True)
+
+def _append_turn_log(scenario_id: str, messages: List[Dict[str, Any]]) -> None:
+    """
+    Appends turns to the scenario's NDJSON log instead of rewriting the whole transcript.
+    
+    This is blocking file I/O; the chat routes call the conversation helpers through
+    asyncio.to_thread, so it never runs on the event loop.
+    """
+    try:
+        _ensure_log_dir(settings.DOWNLOADS_DIR)
+        log_path = os.path.join(settings.DOWNLOADS_DIR, f"{scenario_id}.ndjson")
+        with open(log_path, 'ab') as f:
+            f.write(b"".join(orjson.dumps(message) + b"\n" for message in messages))
+    except Exception as e:
+        print(f"Warning: Failed to append turn log for {scenario_id}: {e}")
+
 def add_conversation_message(scenario_id: str, message: Dict[str, Any]) -> bool:
     """
     Add a message to a conversation.
@@ -78,14 +152,55 @@ def add_conversation_message(scenario_id: str, message: Dict[str, Any]) -> bool:
     Returns:
         True if successful, False otherwise
     """
+    if redis_client:
+        if not redis_client.exists(_scenario_key(scenario_id)):
+            return False
+        redis_client.rpush(_history_key(scenario_id), orjson.dumps(message))
+        if settings.CONVERSATION_LOG_NDJSON:
+            _append_turn_log(scenario_id, [message])
+        return True
+    
     scenario_container = scenarios_db.get(scenario_id)
     if not scenario_container:
         return False
     
-    if "conversation_history" not in scenario_container:
-        scenario_container["conversation_history"] = []
-    
+    formatted_history = _synced_formatted_history(scenario_container)
     scenario_container["conversation_history"].append(message)
+    # Format each turn once as it's added instead of reformatting the whole history every turn
+    formatted_history.append(format_turn(message))
+    if settings.CONVERSATION_LOG_NDJSON:
+        _append_turn_log(scenario_id, [message])
+    return True
+
+def add_conversation_messages(scenario_id: str, messages: List[Dict[str, Any]]) -> bool:
+    """
+    Add several messages to a conversation at once.
+    
+    Args:
+        scenario_id: The scenario ID
+        messages: The messages to add, in order
+        
+    Returns:
+        True if successful, False otherwise
+    """
+    if redis_client:
+        if not redis_client.exists(_scenario_key(scenario_id)):
+            return False
+        if messages:
+            redis_client.rpush(_history_key(scenario_id), *(orjson.dumps(message) for message in messages))
+            if settings.CONVERSATION_LOG_NDJSON:
+                _append_turn_log(scenario_id, messages)
+        return True
+    
+    scenario_container = scenarios_db.get(scenario_id)
+    if not scenario_container:
+        return False
+    
+    formatted_history = _synced_formatted_history(scenario_container)
+    scenario_container["conversation_history"].extend(messages)
+    formatted_history.extend(format_turn(message) for message in messages)
+    if messages and settings.CONVERSATION_LOG_NDJSON:
+        _append_turn_log(scenario_id, messages)
     return True
 
 def get_conversation_history(scenario_id: str) -> List[Dict[str, Any]]:
@@ -98,26 +213,84 @@ def get_conversation_history(scenario_id: str) -> List[Dict[str, Any]]:
     Returns:
         The conversation history
     """
+    if redis_client:
+        return [orjson.loads(raw) for raw in redis_client.lrange(_history_key(scenario_id), 0, -1)]
+    
     scenario_container = scenarios_db.get(scenario_id)
     if not scenario_container or "conversation_history" not in scenario_container:
         return []
     
     return scenario_container["conversation_history"] 
 
+def get_formatted_history(scenario_id: str) -> Optional[str]:
+    """
+    Get the conversation history formatted for the chat prompt.
+    
+    Args:
+        scenario_id: The scenario ID
+        
+    Returns:
+        The preformatted history lines joined by newlines, or None if not kept for this scenario
+    """
+    if redis_client:
+        return None
+    
+    scenario_container = scenarios_db.get(scenario_id)
+    if not scenario_container:
+        return None
+    
+    return "\n".join(_synced_formatted_history(scenario_container))
+
+def get_turn_embeddings(scenario_id: str) -> Optional[List[List[float]]]:
+    """
+    Get the cached user-turn embeddings for a scenario.
+    
+    Args:
+        scenario_id: The scenario ID
+        
+    Returns:
+        The scenario's embedding list (appended to in place), or None if not found
+    """
+    if redis_client:
+        exists = redis_client.exists(_scenario_key(scenario_id))
+        with _turn_embedding_cache_lock:
+            if not exists:
+                _turn_embedding_cache.pop(scenario_id, None)
+                return None
+            # Embeddings are a per-process cache, not shared state, so keep it bounded
+            turn_embeddings = _turn_embedding_cache.get(scenario_id)
+            if turn_embeddings is None:
+                turn_embeddings = _turn_embedding_cache[scenario_id] = []
+                while len(_turn_embedding_cache) > settings.TURN_EMBEDDING_CACHE_SCENARIOS:
+                    _turn_embedding_cache.popitem(last=False)
+            else:
+                _turn_embedding_cache.move_to_end(scenario_id)
+            return turn_embeddings
+    
+    scenario_container = scenarios_db.get(scenario_id)
+    if not scenario_container:
+        return None
+    
+    return scenario_container.setdefault("turn_embeddings", [])
+
 def flush_conversation_to_s3(scenario_id: str) -> None:
     history = get_conversation_history(scenario_id)
     s3.put_object(
         Bucket=BUCKET_NAME,
         Key=_s3_key("conversationData", scenario_id),
-        Body=json.dumps(history),
+        Body=orjson.dumps(history),
         ContentType="application/json"
     )
     scenarios_db.pop(scenario_id, None)
+    with _turn_embedding_cache_lock:
+        _turn_embedding_cache.pop(scenario_id, None)
+    if redis_client:
+        redis_client.delete(_scenario_key(scenario_id), _history_key(scenario_id))
 
 def save_assessment_to_s3(scenario_id: str, assessment_data: Dict[str, Any]) -> None:
     s3.put_object(
         Bucket=BUCKET_NAME,
         Key=_s3_key("assessmentData", scenario_id),
-        Body=json.dumps(assessment_data),
+        Body=orjson.dumps(assessment_data),
         ContentType="application/json"
     )
\ No newline at end of file
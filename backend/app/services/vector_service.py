@@ -1,20 +1,67 @@
 from typing import Dict, List, Any, Optional
-import json
+import asyncio
 from backend.app.core import settings
 
 class VectorService:
     """Service for vector database operations."""
     
-    def __init__(self, qdrant_client=None, collection_name=None):
+    def __init__(self, qdrant_client=None, collection_name=None, embedder=None, turn_embeddings=None):
         """
         Initialize the vector service.
         
         Args:
             qdrant_client: The Qdrant client for retrieval
             collection_name: The name of the Qdrant collection
+            embedder: Optional AsyncGeminiEmbedder used for query embeddings
+            turn_embeddings: Optional per-scenario list of user-turn embeddings; when given,
+                only the new user input is embedded, and record_turn appends it
         """
         self.qdrant_client = qdrant_client
         self.collection_name = collection_name or settings.COLLECTION_NAME
+        self.embedder = embedder
+        self.turn_embeddings = turn_embeddings
+        self._pending_turn_embedding = None
+    
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        """Embeds text over the async client if present, else with the sync SDK in a thread."""
+        if self.embedder:
+            return await self.embedder.embed(text)
+        
+        from backend.app.services.vector_store import generate_embedding
+        return await asyncio.to_thread(generate_embedding, text)
+    
+    async def _turn_query_embedding(self, user_input: str) -> Optional[List[float]]:
+        """
+        Embed the new user turn and average it with the recent cached turns.
+        
+        Args:
+            user_input: The current user input
+            
+        Returns:
+            The mean of the last RETRIEVAL_HISTORY_TURNS + 1 turn embeddings, or None on failure
+        """
+        from backend.app.services.vector_store import RETRIEVAL_HISTORY_TURNS
+        
+        embedding = await self._embed(user_input)
+        if not embedding:
+            return None
+        # Kept aside until the turn is recorded, so a failed turn never enters the cache
+        self._pending_turn_embedding = embedding
+        
+        # Earlier turns were embedded on their own turn, so history costs nothing to re-embed
+        recent = self.turn_embeddings[-RETRIEVAL_HISTORY_TURNS:] + [embedding]
+        return [sum(values) / len(recent) for values in zip(*recent)]
+    
+    def record_turn(self) -> None:
+        """Cache the current turn's embedding once the turn has been added to the history."""
+        from backend.app.services.vector_store import RETRIEVAL_HISTORY_TURNS
+        
+        if self.turn_embeddings is None or self._pending_turn_embedding is None:
+            return
+        self.turn_embeddings.append(self._pending_turn_embedding)
+        self._pending_turn_embedding = None
+        # Only the most recent turns are ever averaged
+        del self.turn_embeddings[:-RETRIEVAL_HISTORY_TURNS]
     
     async def retrieve_relevant_examples(
         self,
@@ -41,15 +88,32 @@ class VectorService:
         
         try:
             # Use the implementation from vector_store.py directly
-            from backend.app.services.vector_store import retrieve_relevant_examples as retrieve_examples
+            from backend.app.services.vector_store import retrieve_relevant_examples as retrieve_examples, build_query_text
+            
+            retrieve_kwargs = {}
+            if self.turn_embeddings is not None:
+                retrieve_kwargs["query_embedding"] = await self._turn_query_embedding(user_input)
+                if not retrieve_kwargs["query_embedding"]:
+                    print("Failed to generate query embedding.")
+                    return {}
+            elif self.embedder:
+                # Embed on the event loop over the async client; only the search runs in a thread
+                query_text = build_query_text(user_input, conversation_history, scenario)
+                retrieve_kwargs["query_embedding"] = await self.embedder.embed(query_text)
+                if not retrieve_kwargs["query_embedding"]:
+                    print("Failed to generate query embedding.")
+                    return {}
             
-            results = retrieve_examples(
+            # Blocking SDK and Qdrant calls run in a worker thread to keep the event loop free
+            results = await asyncio.to_thread(
+                retrieve_examples,
                 client=self.qdrant_client,
                 collection_name=self.collection_name,
                 user_input=user_input,
                 conversation_history=conversation_history,
                 scenario=scenario,
-                n_results=n_results
+                n_results=n_results,
+                **retrieve_kwargs
             )
             
             return results
@@ -1,8 +1,14 @@
 import os
 import json
+import orjson
+import hashlib
+import atexit
+import threading
+import warnings
+from collections import deque
 import qdrant_client
 from qdrant_client.http import models
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import google.generativeai as genai
 from backend.app.core import settings, get_api_key_or_raise
 
@@ -66,6 +72,58 @@ def get_or_create_collection(client, collection_name: str = settings.COLLECTION_
         print(f"Error getting or creating collection: {e}")
         return None
 
+def begin_bulk_ingest(client, collection_name: str) -> bool:
+    """
+    Put a collection into bulk ingest mode by pausing HNSW indexing.
+
+    Qdrant otherwise rebuilds index segments while points are still streaming in.
+    Only call this from the ingestion pipeline, never on the live query path.
+
+    Args:
+        client: The Qdrant client
+        collection_name: Name of the collection
+
+    Returns:
+        True if indexing was paused, False otherwise
+    """
+    if not settings.QDRANT_BULK_INGEST:
+        return False
+
+    try:
+        client.update_collection(
+            collection_name=collection_name,
+            optimizer_config=models.OptimizersConfigDiff(indexing_threshold=0)
+        )
+        print(f"Bulk ingest mode enabled for collection: {collection_name}")
+        return True
+    except Exception as e:
+        print(f"Error enabling bulk ingest mode: {e}")
+        return False
+
+def finalize_ingest(client, collection_name: str) -> bool:
+    """
+    Restore the indexing threshold after a bulk ingest so queries use HNSW again.
+
+    Args:
+        client: The Qdrant client
+        collection_name: Name of the collection
+
+    Returns:
+        True if the indexing threshold was restored, False otherwise
+    """
+    try:
+        client.update_collection(
+            collection_name=collection_name,
+            optimizer_config=models.OptimizersConfigDiff(
+                indexing_threshold=settings.QDRANT_INDEXING_THRESHOLD
+            )
+        )
+        print(f"Bulk ingest mode disabled for collection: {collection_name}")
+        return True
+    except Exception as e:
+        print(f"Error restoring indexing after bulk ingest: {e}")
+        return False
+
 def generate_embedding(text: str, model_name: str = settings.EMBEDDING_MODEL_NAME):
     """
     Generates embedding for the given text using the provided model name.
@@ -89,6 +147,49 @@ def generate_embedding(text: str, model_name: str = settings.EMBEDDING_MODEL_NAM
         print(f"Error generating embedding for text (model: {model_name}): {e}")
         return None
 
+def generate_embeddings(
+    texts: List[str],
+    model_name: str = settings.EMBEDDING_MODEL_NAME,
+    batch_size: int = settings.BATCH_SIZE
+) -> List[Optional[List[float]]]:
+    """
+    Generates embeddings for several texts, sending up to batch_size texts per request.
+    
+    Args:
+        texts: Texts to generate embeddings for
+        model_name: Model name to use, defaults to settings.EMBEDDING_MODEL_NAME
+        batch_size: Maximum number of texts per embedding request
+        
+    Returns:
+        List of embeddings aligned with texts; entries are None where a request failed
+    """
+    embeddings: List[Optional[List[float]]] = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        try:
+            response = genai.embed_content(
+                model=model_name,
+                content=batch,
+                task_type="retrieval_query"
+            )
+            embeddings.extend(response["embedding"])
+        except Exception as e:
+            print(f"Error generating embeddings for batch of {len(batch)} texts (model: {model_name}): {e}")
+            embeddings.extend([None] * len(batch))
+    return embeddings
+
+class _WriteBuffer:
+    """Points queued by store_document for a single client/collection pair."""
+
+    def __init__(self, client, collection_name: str):
+        self.client = client
+        self.collection_name = collection_name
+        self.points = deque()
+
+# Pending writes keyed by (id(client), collection_name), drained by flush_documents
+_write_buffers: Dict[Tuple[int, str], _WriteBuffer] = {}
+_write_buffers_lock = threading.Lock()
+
 def store_document(
     client,
     collection_name: str,
@@ -97,7 +198,12 @@ def store_document(
     metadata: Dict[str, Any]
 ):
     """
-    Store a document in the vector database.
+    Queue a document for storage in the vector database.
+    
+    Deprecated: a single-point upsert costs a full Qdrant write per document.
+    Use process_and_store_blocks for ingestion. Documents queued here are
+    written in one batch once settings.BATCH_SIZE is reached, on
+    flush_documents, or at interpreter exit.
     
     Args:
         client: The Qdrant client
@@ -106,6 +212,11 @@ def store_document(
         text: The text content to embed and store
         metadata: Additional metadata for the document
     """
+    warnings.warn(
+        "store_document is deprecated, use process_and_store_blocks for batched ingestion",
+        DeprecationWarning,
+        stacklevel=2
+    )
     try:
         # Generate embedding
         embedding = generate_embedding(text, settings.EMBEDDING_MODEL_NAME)
@@ -113,25 +224,75 @@ def store_document(
             print(f"Error: Failed to generate embedding for document {document_id}")
             return False
             
-        # Add to collection
+        point = models.PointStruct(
+            id=document_id,
+            vector=embedding,
+            payload={
+                "text": text,
+                **metadata
+            }
+        )
+        
+        with _write_buffers_lock:
+            key = (id(client), collection_name)
+            buffer = _write_buffers.get(key)
+            if buffer is None:
+                buffer = _write_buffers[key] = _WriteBuffer(client, collection_name)
+            buffer.points.append(point)
+            buffer_full = len(buffer.points) >= settings.BATCH_SIZE
+        
+        if buffer_full:
+            flush_documents(client, collection_name)
+        return True
+    except Exception as e:
+        print(f"Error storing document: {e}")
+        return False
+
+def flush_documents(client, collection_name: str) -> bool:
+    """
+    Write every document queued by store_document for this collection in one upsert.
+    
+    Args:
+        client: The Qdrant client
+        collection_name: Name of the collection
+        
+    Returns:
+        True if the buffer was written (or empty), False otherwise
+    """
+    key = (id(client), collection_name)
+    with _write_buffers_lock:
+        buffer = _write_buffers.pop(key, None)
+    
+    if buffer is None or not buffer.points:
+        return True
+    
+    try:
         client.upsert(
             collection_name=collection_name,
-            points=[
-                models.PointStruct(
-                    id=document_id,
-                    vector=embedding,
-                    payload={
-                        "text": text,
-                        **metadata
-                    }
-                )
-            ]
+            points=list(buffer.points)
         )
         return True
     except Exception as e:
-        print(f"Error storing document: {e}")
+        print(f"Error flushing {len(buffer.points)} documents to {collection_name}: {e}")
+        # Requeue the points ahead of anything stored meanwhile so a later flush retries them
+        with _write_buffers_lock:
+            current = _write_buffers.get(key)
+            if current is None:
+                _write_buffers[key] = buffer
+            else:
+                current.points.extendleft(reversed(buffer.points))
         return False
 
+def flush_all_documents():
+    """Flush every pending store_document buffer, registered to run at exit."""
+    with _write_buffers_lock:
+        buffers = list(_write_buffers.values())
+    
+    for buffer in buffers:
+        flush_documents(buffer.client, buffer.collection_name)
+
+atexit.register(flush_all_documents)
+
 def process_and_store_blocks(input_filepath: str, client, collection_name: str):
     """
     Loads data, generates embeddings, and stores them in Qdrant.
@@ -148,12 +309,12 @@ def process_and_store_blocks(input_filepath: str, client, collection_name: str):
     # 1. Load the tagged data
     print(f"Loading tagged data from: {input_filepath}")
     try:
-        with open(input_filepath, 'r', encoding='utf-8') as f:
-            chunk_data = json.load(f)
+        with open(input_filepath, 'rb') as f:
+            chunk_data = orjson.loads(f.read())
     except FileNotFoundError:
         print(f"Error: Input file not found at {input_filepath}")
         return
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error: Could not decode JSON from input file {input_filepath}. Error: {e}")
         return
     except Exception as e:
@@ -165,91 +326,107 @@ def process_and_store_blocks(input_filepath: str, client, collection_name: str):
         return
     print(f"Loaded data for {len(chunk_data)} chunks.")
 
-    # Lists for batch insertion
-    batch_points = []
-    total_blocks_processed = 0
-    total_errors = 0
+    # Pause indexing for the duration of the ingest if configured
+    bulk_ingest = begin_bulk_ingest(client, collection_name)
+    try:
+        # Block ids and payloads in input order, plus the positions sharing each text
+        block_ids: List[str] = []
+        payloads: List[Dict[str, Any]] = []
+        unique_texts: Dict[str, str] = {}
+        text_to_indices: Dict[str, List[int]] = {}
+        total_blocks_processed = 0
+        total_errors = 0
 
-    # 2. Iterate through chunks and blocks
-    for chunk_index, chunk in enumerate(chunk_data):
-        chunk_num = chunk.get('chunk_num', chunk_index + 1)
-        processed_blocks = chunk.get('processed_blocks', [])
+        # 2. Iterate through chunks and blocks
+        for chunk_index, chunk in enumerate(chunk_data):
+            chunk_num = chunk.get('chunk_num', chunk_index + 1)
+            processed_blocks = chunk.get('processed_blocks', [])
         
-        if not isinstance(processed_blocks, list):
-             print(f"Warning: No valid 'processed_blocks' list found in chunk {chunk_num}. Skipping chunk.")
-             continue
+            if not isinstance(processed_blocks, list):
+                 print(f"Warning: No valid 'processed_blocks' list found in chunk {chunk_num}. Skipping chunk.")
+                 continue
              
-        print(f"Processing Chunk {chunk_num} ({len(processed_blocks)} blocks)")
+            print(f"Processing Chunk {chunk_num} ({len(processed_blocks)} blocks)")
 
-        for block_index, block in enumerate(processed_blocks):
-            block_id_from_data = block.get('block_id')
-            # Use block_id if present, otherwise generate one based on index
-            block_identifier = block_id_from_data if block_id_from_data is not None else f"idx_{block_index + 1}"
-            unique_doc_id = f"chunk_{chunk_num}_block_{block_identifier}" 
+            for block_index, block in enumerate(processed_blocks):
+                block_id_from_data = block.get('block_id')
+                # Use block_id if present, otherwise generate one based on index
+                block_identifier = block_id_from_data if block_id_from_data is not None else f"idx_{block_index + 1}"
+                unique_doc_id = f"chunk_{chunk_num}_block_{block_identifier}" 
             
-            lines = block.get('lines')
-            tagging_result = block.get('tagging_result')
-            summary = block.get('summary') # Optional
+                lines = block.get('lines')
+                tagging_result = block.get('tagging_result')
+                summary = block.get('summary') # Optional
             
-            if not lines or not isinstance(lines, list):
-                print(f"  Skipping block {block_identifier} in chunk {chunk_num} due to missing/invalid lines.")
-                total_errors += 1
-                continue
-
-            # Prepare text and metadata
-            text_to_embed = "\n".join(lines)
-            metadata = {
-                "chunk_num": chunk_num,
-                "block_id": block_identifier, # Store the identifier we used
-                "start_line": block.get("start_line"),
-                "end_line": block.get("end_line"),
-                "summary": summary if summary else "", # Ensure basic type
-            }
+                if not lines or not isinstance(lines, list):
+                    print(f"  Skipping block {block_identifier} in chunk {chunk_num} due to missing/invalid lines.")
+                    total_errors += 1
+                    continue
 
-            # Extract fields from tagging_result[0] and add to metadata
-            if isinstance(tagging_result, list) and tagging_result:
-                tagging_data = tagging_result[0] # Get the first element
-                if isinstance(tagging_data, dict):
-                    for key, value in tagging_data.items():
-                        if isinstance(value, list) or isinstance(value, dict):
-                            metadata[key] = json.dumps(value)
-                        elif value is not None: # Add if not None
-                             metadata[key] = value
-                        # else: skip None values implicitly
+                # Prepare text and metadata
+                text_to_embed = "\n".join(lines)
+                metadata = {
+                    "chunk_num": chunk_num,
+                    "block_id": block_identifier, # Store the identifier we used
+                    "start_line": block.get("start_line"),
+                    "end_line": block.get("end_line"),
+                    "summary": summary if summary else "", # Ensure basic type
+                }
+
+                # Extract fields from tagging_result[0] and add to metadata
+                if isinstance(tagging_result, list) and tagging_result:
+                    tagging_data = tagging_result[0] # Get the first element
+                    if isinstance(tagging_data, dict):
+                        for key, value in tagging_data.items():
+                            if isinstance(value, list) or isinstance(value, dict):
+                                metadata[key] = json.dumps(value)
+                            elif value is not None: # Add if not None
+                                 metadata[key] = value
+                            # else: skip None values implicitly
+                    else:
+                        print(f"  Warning: tagging_result[0] for block {unique_doc_id} is not a dictionary. Skipping tags.")
                 else:
-                    print(f"  Warning: tagging_result[0] for block {unique_doc_id} is not a dictionary. Skipping tags.")
-            else:
-                print(f"  Warning: Missing or invalid tagging_result for block {unique_doc_id}. Skipping tags.")
+                    print(f"  Warning: Missing or invalid tagging_result for block {unique_doc_id}. Skipping tags.")
 
-            # Remove None values from metadata for Qdrant compatibility
-            metadata = {k: v for k, v in metadata.items() if v is not None}
+                # Remove None values from metadata for Qdrant compatibility
+                metadata = {k: v for k, v in metadata.items() if v is not None}
 
-            # 3. Generate Embedding
-            try:
-                # Use the generate_embedding function
-                embedding = generate_embedding(text_to_embed, settings.EMBEDDING_MODEL_NAME)
-                if not embedding:
-                     raise ValueError("Failed to generate embedding")
-                     
-            except Exception as e:
-                print(f"  Error generating embedding for {unique_doc_id}: {e}")
+                # Identical texts share one embedding, keyed by digest to keep the index small
+                text_hash = hashlib.sha256(text_to_embed.encode("utf-8")).hexdigest()
+                unique_texts.setdefault(text_hash, text_to_embed)
+                text_to_indices.setdefault(text_hash, []).append(len(payloads))
+                block_ids.append(unique_doc_id)
+                payloads.append({"text": text_to_embed, **metadata})
+
+        # 3. Generate embeddings once per unique text and scatter them back to blocks
+        print(f"Embedding {len(unique_texts)} unique texts for {len(payloads)} blocks...")
+        unique_hashes = list(text_to_indices)
+        unique_embeddings = generate_embeddings(
+            [unique_texts[text_hash] for text_hash in unique_hashes],
+            settings.EMBEDDING_MODEL_NAME
+        )
+        embeddings: List[Optional[List[float]]] = [None] * len(payloads)
+        for text_hash, embedding in zip(unique_hashes, unique_embeddings):
+            for i in text_to_indices[text_hash]:
+                embeddings[i] = embedding
+
+        # 4. Add points to Qdrant in batches
+        batch_points = []
+        for unique_doc_id, embedding, payload in zip(block_ids, embeddings, payloads):
+            if not embedding:
+                print(f"  Error generating embedding for {unique_doc_id}: Failed to generate embedding")
                 total_errors += 1
                 continue # Skip adding this block if embedding failed
             
-            # Add to batch
             batch_points.append(
                 models.PointStruct(
                     id=unique_doc_id,
                     vector=embedding,
-                    payload={
-                        "text": text_to_embed,
-                        **metadata
-                    }
+                    payload=payload
                 )
             )
             total_blocks_processed += 1
 
-            # 4. Add batch to Qdrant if size reached
             if len(batch_points) >= settings.BATCH_SIZE:
                 print(f"  Adding batch of {len(batch_points)} items to Qdrant...")
                 try:
@@ -258,38 +435,71 @@ def process_and_store_blocks(input_filepath: str, client, collection_name: str):
                         points=batch_points
                     )
                     print(f"  Batch added successfully.")
-                    # Clear batch
-                    batch_points = []
                 except Exception as e:
                     print(f"  Error adding batch to Qdrant: {e}")
                     total_errors += len(batch_points) # Count errors for the whole batch
-                    batch_points = []
+                # Clear batch
+                batch_points = []
 
-    # 5. Add any remaining items after the loop
-    if batch_points:
-        print(f"Adding final batch of {len(batch_points)} items to Qdrant...")
-        try:
-            client.upsert(
-                collection_name=collection_name,
-                points=batch_points
-            )
-            print(f"Final batch added successfully.")
-        except Exception as e:
-            print(f"Error adding final batch to Qdrant: {e}")
-            total_errors += len(batch_points)
+        # 5. Add any remaining items after the loop
+        if batch_points:
+            print(f"Adding final batch of {len(batch_points)} items to Qdrant...")
+            try:
+                client.upsert(
+                    collection_name=collection_name,
+                    points=batch_points
+                )
+                print(f"Final batch added successfully.")
+            except Exception as e:
+                print(f"Error adding final batch to Qdrant: {e}")
+                total_errors += len(batch_points)
+    finally:
+        if bulk_ingest:
+            finalize_ingest(client, collection_name)
 
     print(f"\n--- Embedding and Storage Complete ---")
     print(f"Total blocks processed and attempted to add: {total_blocks_processed}")
     print(f"Total errors encountered: {total_errors}")
 
 
+# Number of trailing conversation turns folded into the retrieval query
+RETRIEVAL_HISTORY_TURNS = 3
+
+def build_query_text(
+    user_input: str,
+    conversation_history: List[Dict[str, str]],
+    scenario: Dict[str, Any]
+) -> str:
+    """
+    Builds the text embedded to query the vector database.
+    
+    Args:
+        user_input: The current user input
+        conversation_history: The conversation history
+        scenario: The scenario data
+        
+    Returns:
+        The user input followed by the non-empty history and scenario sections
+    """
+    recent_turns = conversation_history[-RETRIEVAL_HISTORY_TURNS:]
+    history_str = " ".join(content for content in (turn.get("content", "") for turn in recent_turns) if content)  # Last 3 turns
+    scenario_str = " ".join(f"{k}:{v}" for k, v in scenario.items() if v is not None)
+    # Leave out empty sections so they don't add noise to the query embedding
+    query_parts = [user_input]
+    if history_str:
+        query_parts.append(f"[History: {history_str}]")
+    if scenario_str:
+        query_parts.append(f"[Scenario: {scenario_str}]")
+    return " ".join(query_parts)
+
 def retrieve_relevant_examples(
     client,
     collection_name: str,
     user_input: str,
     conversation_history: List[Dict[str, str]],
     scenario: Dict[str, Any],
-    n_results: int = 5
+    n_results: int = 5,
+    query_embedding: Optional[List[float]] = None
 ):
     """
     Retrieve relevant examples from the vector database.
@@ -301,6 +511,7 @@ def retrieve_relevant_examples(
         conversation_history: The conversation history
         scenario: The scenario data
         n_results: Number of results to retrieve
+        query_embedding: Precomputed embedding of build_query_text(...); generated here if omitted
         
     Returns:
         Dict with retrieved examples
@@ -314,13 +525,10 @@ def retrieve_relevant_examples(
             "documents": []
         }
 
-    # 1. Construct combined query text
-    history_str = " ".join([turn.get("content", "") for turn in conversation_history[-3:]])  # Last 3 turns
-    scenario_str = " ".join([f"{k}:{v}" for k, v in scenario.items() if v is not None])
-    query_text = f"{user_input} [History: {history_str}] [Scenario: {scenario_str}]"
-    
-    # 2. Generate embedding for query
-    query_embedding = generate_embedding(query_text, settings.EMBEDDING_MODEL_NAME)
+    # 1-2. Construct combined query text and generate its embedding
+    if query_embedding is None:
+        query_text = build_query_text(user_input, conversation_history, scenario)
+        query_embedding = generate_embedding(query_text, settings.EMBEDDING_MODEL_NAME)
     if not query_embedding:
         print("Failed to generate query embedding.")
         return {
@@ -332,24 +540,18 @@ def retrieve_relevant_examples(
     print("Generated query embedding.")
 
     # 3. Construct Qdrant metadata filter from scenario
-    # Only include filters for keys present in the scenario dict
-    filter_conditions = []
-    for key, value in scenario.items():
-        if value is not None:
-            # Basic equality check for simplicity
-            filter_conditions.append(
-                models.FieldCondition(
-                    key=key,
-                    match=models.MatchValue(value=value)
-                )
-            )
+    # Only include filters for keys present in the scenario dict. Conditions are
+    # ANDed via must=: OR-ing unrelated scenario keys would match any example that
+    # shares a single attribute, and must= lets Qdrant prune candidates during search.
+    filter_conditions = [
+        models.FieldCondition(key=key, match=models.MatchValue(value=value))  # Basic equality check
+        for key, value in scenario.items()
+        if value is not None
+    ]
     
     filter_query = None
     if filter_conditions:
-        filter_query = models.Filter(
-            must=filter_conditions  # All conditions must match (AND)
-            # To use OR logic, use should=filter_conditions instead
-        )
+        filter_query = models.Filter(must=filter_conditions)  # All conditions must match (AND)
     else:
         print("No scenario filters applied.")
     
@@ -1,5 +1,9 @@
-import json
-import os # Need os for path manipulation
+import re
+from pydantic_core import from_json
+
+# Optional leading ```json / ``` fence and optional trailing ``` fence; the lazy
+# group captures the payload with surrounding whitespace trimmed in one pass.
+_FENCE_RE = re.compile(r"\A\s*(?:```(?:json)?)?\s*(.*?)\s*(?:```)?\s*\Z", re.DOTALL)
 
 def clean_gemini_output(raw_text: str):
     """Cleans a string potentially containing JSON wrapped in markdown fences.
@@ -15,23 +19,16 @@ def clean_gemini_output(raw_text: str):
         print(f"Error: Input to clean_gemini_output must be a string, got {type(raw_text)}")
         return None
         
-    cleaned = raw_text.strip()
-    
-    # Remove optional markdown fences
-    if cleaned.startswith("```json"):
-        cleaned = cleaned[len("```json"):]
-    if cleaned.endswith("```"):
-        cleaned = cleaned[:-len("```")]
-        
-    # Strip whitespace again after removing fences
-    cleaned = cleaned.strip()
+    # Remove optional markdown fences and surrounding whitespace
+    match = _FENCE_RE.match(raw_text)
+    cleaned = match.group(1) if match else raw_text.strip()
     
     # Parse the cleaned string as JSON
     try:
-        # json.loads handles standard JSON unescaping (e.g., \" -> ")
-        parsed = json.loads(cleaned)
+        # pydantic_core's from_json (jiter) parses the str directly in Rust, no extra copy
+        parsed = from_json(cleaned)
         return parsed
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         print(f"Failed to parse cleaned Gemini output as JSON: {e}")
         print(f"Cleaned string before parsing attempt: {cleaned[:500]}...") # Log problematic string
         return None
@@ -6,7 +6,8 @@ used for generating AI responses and evaluating user interactions.
 """
 
 import os
-import json
+import orjson
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any, Optional
 
@@ -22,10 +23,18 @@ from backend.data.prompts.prompts import (
 DATA_DIR = Path(__file__).parent
 ARCHETYPES_FILE = os.path.join(DATA_DIR, "archetypes.json")
 
+@lru_cache(maxsize=1)
+def _load_archetypes_file(path: str, mtime: float) -> Dict[str, Any]:
+    """Parses the archetypes file; mtime is part of the cache key so edits are picked up."""
+    return orjson.loads(Path(path).read_bytes())
+
 def load_archetypes(file_path: Optional[str] = None) -> Dict[str, Any]:
     """
     Load archetypes data from the archetypes.json file.
     
+    The parsed data is cached until the file's modification time changes,
+    so the returned dict is shared and should be treated as read-only.
+    
     Args:
         file_path: Optional custom path to the archetypes file.
                   If None, uses the default path.
@@ -34,9 +43,8 @@ def load_archetypes(file_path: Optional[str] = None) -> Dict[str, Any]:
         dict: The parsed archetypes data
     """
     try:
-        path_to_use = file_path if file_path else ARCHETYPES_FILE
-        with open(path_to_use, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        path_to_use = str(file_path if file_path else ARCHETYPES_FILE)
+        return _load_archetypes_file(path_to_use, os.path.getmtime(path_to_use))
     except Exception as e:
         print(f"Error loading archetypes data: {e}")
         return {}
@@ -9,17 +9,15 @@ import json
 import asyncio
 import pytest
 from pathlib import Path
+from types import MappingProxyType
 
 # Paths
 TESTS_DIR = Path(__file__).parent
 PROJECT_ROOT = Path(__file__).parent.parent
 TEST_DATA_DIR = TESTS_DIR / "data"
 
-# Create test data directory if it doesn't exist
-os.makedirs(TEST_DATA_DIR, exist_ok=True)
-
-# Common test data
-SAMPLE_SCENARIO = {
+# Common test data, read-only so fixtures can share it without copying
+SAMPLE_SCENARIO = MappingProxyType({
     "scenario_type": "dating",
     "setting": "party",
     "goal": "first impression",
@@ -27,29 +25,35 @@ SAMPLE_SCENARIO = {
     "roast_level": 2,
     "player_sex": "female",
     "system_sex": "male"
-}
+})
 
-SAMPLE_MESSAGES = [
+SAMPLE_MESSAGES = tuple(MappingProxyType(message) for message in [
     {"role": "user", "content": "Excuse me, have you ever been to tennessee? cuz you're the only ten i see"},
     {"role": "assistant", "content": "lmao, that was a good one, thank you. and yeah, i am actually from tennessee, lol. "},
     {"role": "user", "content": "ok, well i didnt actually thought you were from tennessee, lol. did you come here for the party?"},
     {"role": "assistant", "content": "yeah, i'm here for a weekend. one of the organizer is my best friend so i had to pull up"}
-]
+])
 
 
 # Utility functions
+def make_scenario(**overrides):
+    """Return the sample scenario as a new dict, with the given fields replaced."""
+    return {**SAMPLE_SCENARIO, **overrides}
+
 def load_test_json(filename):
     """Load test JSON data from the test data directory."""
     file_path = TEST_DATA_DIR / filename
-    if not os.path.exists(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
         return None
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
 
 def save_test_json(data, filename):
     """Save test data as JSON to the test data directory."""
     file_path = TEST_DATA_DIR / filename
+    # Created on first save rather than on every test collection
+    os.makedirs(TEST_DATA_DIR, exist_ok=True)
     
     with open(file_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2)
@@ -73,6 +77,7 @@ __all__ = [
     'TEST_DATA_DIR',
     'SAMPLE_SCENARIO',
     'SAMPLE_MESSAGES',
+    'make_scenario',
     'load_test_json',
     'save_test_json',
 ] 
\ No newline at end of file
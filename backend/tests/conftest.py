@@ -2,17 +2,29 @@
 Pytest configuration and fixtures.
 """
 import pytest
+import pytest_asyncio
+import httpx
 import os
+import orjson
+from pathlib import Path
+from types import SimpleNamespace
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
 from unittest.mock import MagicMock, patch, AsyncMock
+from contextlib import asynccontextmanager
 from backend.app import create_application
 from backend.tests import SAMPLE_SCENARIO, SAMPLE_MESSAGES
 
+@asynccontextmanager
+async def mock_lifespan(app: FastAPI):
+    """Stand-in lifespan that keeps the mocked state instead of connecting to Gemini and Qdrant."""
+    yield
+
 @pytest.fixture(scope="session")
 def app():
     # Create a test instance of the app
     application = create_application()
+    application.router.lifespan_context = mock_lifespan
     # --- Add a mock model to the state for tests ---
     application.state.chat_model = AsyncMock() # Add a simple mock
 
@@ -21,42 +33,104 @@ def app():
     
     return application
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def client(app):
-    """Create a test client for the FastAPI application."""
-    return TestClient(app)
+    """Create a test client for the FastAPI application, started once per module."""
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def fresh_scenarios():
+    """Clear the in-memory scenarios before and after a test that needs isolation."""
+    from backend.app.services.scenarios import scenarios_db
+    scenarios_db.clear()
+    yield scenarios_db
+    scenarios_db.clear()
+
+@pytest.fixture
+def app_factory_mocks():
+    """
+    Patch what create_application builds the app from, with fresh mocks for each test.
+    
+    Yields a dict with the mocked FastAPI class, the app it returns, settings and api_router.
+    """
+    mock_app = MagicMock()
+    mock_settings = MagicMock(
+        API_V1_STR='/api/v1',
+        PROJECT_NAME='Test Project',
+        BACKEND_CORS_ORIGINS=['http://localhost:3000']
+    )
+    mocks = {'FastAPI': MagicMock(return_value=mock_app), 'settings': mock_settings}
+    with patch.multiple('backend.app', **mocks), patch('backend.app.api.api_router') as mock_router:
+        yield {**mocks, 'app': mock_app, 'api_router': mock_router}
+
+@pytest.fixture(scope="module")
+def mock_embed_content():
+    """Patch genai.embed_content for the module; tests set its return_value."""
+    with patch('backend.app.services.vector_store.genai.embed_content') as mock_embed:
+        yield mock_embed
+
+@pytest.fixture(scope="session")
+def mock_chat_model_factory():
+    """
+    Return a function that builds a mock Gemini chat model.
+    
+    make(text=...) returns a model whose generate_content_async responds with that
+    text; make(side_effect=...) makes the call raise or delegate instead.
+    """
+    def make(text=None, side_effect=None):
+        model = AsyncMock()
+        if side_effect is not None:
+            model.generate_content_async.side_effect = side_effect
+        elif text is not None:
+            # Callers only read .text, so a plain object is enough and can't be awaited by mistake
+            model.generate_content_async.return_value = SimpleNamespace(text=text)
+        return model
+    return make
+
+@pytest.fixture(scope="session")
+def archetypes_json():
+    """Parse the archetypes file once for the whole test session, independently of the cached loaders."""
+    from backend.app.core import settings
+    return orjson.loads(Path(settings.ARCHETYPES_FILE).read_bytes())
+
+@pytest.fixture
+def fresh_archetypes_bundle():
+    """Clear the cached assessment archetype strings so a test renders them from the file."""
+    from backend.app.services.assessments import _archetypes_bundle
+    _archetypes_bundle.cache_clear()
+    yield
+    _archetypes_bundle.cache_clear()
+
+@pytest_asyncio.fixture
+async def async_client(app):
+    """Create an async client that calls the FastAPI application in-process."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as async_client:
+        yield async_client
+
+@pytest.fixture(scope="module")
+def created_scenario_id():
+    """Create one scenario shared by the tests of a module."""
+    from backend.app.services.scenarios import create_scenario
+    return create_scenario(dict(SAMPLE_SCENARIO))
 
 @pytest.fixture
 def sample_scenario_data():
-    """Return sample scenario data for testing."""
-    return SAMPLE_SCENARIO.copy()
+    """Return read-only sample scenario data for testing."""
+    return SAMPLE_SCENARIO
+
+@pytest.fixture
+def sample_scenario_data_mutable():
+    """Return a plain dict copy of the sample scenario, for tests that modify, send or store it."""
+    return dict(SAMPLE_SCENARIO)
 
 @pytest.fixture
 def sample_chat_message():
-    """Return a sample chat message for testing."""
-    return SAMPLE_MESSAGES[0].copy()
-
-# @pytest.fixture(autouse=True)
-# def reset_scenarios_state():
-#     """
-#     Automatically clears the in-memory scenarios_db before each test.
-#     'autouse=True' ensures it runs for every test function.
-#     """
-#     scenarios_db.clear()
-#     yield
+    """Return a read-only sample chat message for testing."""
+    return SAMPLE_MESSAGES[0]
 
 @pytest.fixture
 def sample_conversation():
     """Return a sample conversation history for testing."""
-    return SAMPLE_MESSAGES.copy()
-
-@pytest.fixture
-def cleanup_scenarios():
-    """Fixture to clean up scenarios created during testing."""
-    # Setup - nothing to do here
-    yield
-    # Teardown - could clear the in-memory scenarios in a real implementation
-    # For example: 
-    # from backend.app.services.scenarios import scenarios_db
-    # scenarios_db.clear()
-    pass 
\ No newline at end of file
+    # The history gets flushed to S3, so the messages have to be plain dicts
+    return [dict(message) for message in SAMPLE_MESSAGES]
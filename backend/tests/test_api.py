@@ -4,11 +4,12 @@ Tests for the API endpoints.
 import pytest
 from fastapi import status
 from unittest.mock import patch, MagicMock, AsyncMock
+from backend.app.core import settings
 from backend.app.services.scenarios import create_scenario, scenarios_db, add_conversation_message
 
-def test_create_scenario_endpoint(client, sample_scenario_data):
+async def test_create_scenario_endpoint(async_client, sample_scenario_data_mutable):
     """Test the endpoint for creating a scenario."""
-    response = client.post("/api/v1/scenario", json=sample_scenario_data)
+    response = await async_client.post("/api/v1/scenario", json=sample_scenario_data_mutable)
     
     # Check status code
     assert response.status_code == status.HTTP_201_CREATED
@@ -17,16 +18,18 @@ def test_create_scenario_endpoint(client, sample_scenario_data):
     data = response.json()
     assert "id" in data
     assert data["id"].startswith("conversation-")
+
+def test_create_scenario_invalid_body(client, sample_scenario_data):
+    """Test that an invalid scenario body is rejected with a 422."""
+    invalid_data = {**sample_scenario_data, "roast_level": 9}
+    response = client.post("/api/v1/scenario", json=invalid_data)
     
-    return data["id"]
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert response.json()["detail"][0]["loc"] == ["body", "roast_level"]
 
-def test_get_scenario_endpoint(client, sample_scenario_data):
+async def test_get_scenario_endpoint(async_client, created_scenario_id, sample_scenario_data):
     """Test the endpoint for retrieving a scenario."""
-    # First create a scenario
-    scenario_id = test_create_scenario_endpoint(client, sample_scenario_data)
-    
-    # Then retrieve it
-    response = client.get(f"/api/v1/scenario/{scenario_id}")
+    response = await async_client.get(f"/api/v1/scenario/{created_scenario_id}")
     
     # Check status code
     assert response.status_code == status.HTTP_200_OK
@@ -36,10 +39,10 @@ def test_get_scenario_endpoint(client, sample_scenario_data):
     for key, value in sample_scenario_data.items():
         assert data[key] == value
 
-def test_get_nonexistent_scenario(client):
+async def test_get_nonexistent_scenario(async_client):
     """Test retrieving a scenario that doesn't exist."""
     nonexistent_id = "conversation-99999999-nonexistent"
-    response = client.get(f"/api/v1/scenario/{nonexistent_id}")
+    response = await async_client.get(f"/api/v1/scenario/{nonexistent_id}")
     
     # Should return a 404 not found
     assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -48,7 +51,7 @@ def test_get_nonexistent_scenario(client):
     assert nonexistent_id in response.json()["detail"]
 
 @patch('backend.app.api.routes.chat.process_chat', new_callable=AsyncMock)
-def test_chat_endpoint(mock_process_chat: AsyncMock, client, sample_scenario_data, sample_chat_message):
+def test_chat_endpoint(mock_process_chat: AsyncMock, client, sample_scenario_data_mutable, sample_chat_message):
     """
     Test sending a chat message in an existing scenario.
     
@@ -57,7 +60,7 @@ def test_chat_endpoint(mock_process_chat: AsyncMock, client, sample_scenario_dat
     the API layer and the underlying chat service.
     """
     # First create a scenario
-    scenario_id = create_scenario(sample_scenario_data)
+    scenario_id = create_scenario(sample_scenario_data_mutable)
     assert scenario_id in scenarios_db, f"Scenario {scenario_id} NOT found in scenarios_db immediately after creation!"
     client.app.state.chroma_client = None
 
@@ -102,7 +105,7 @@ def test_chat_nonexistent_scenario(client, sample_chat_message):
 
 
 @patch('backend.app.api.routes.assessment.generate_conversation_assessment', new_callable=AsyncMock)
-def test_assessment_endpoint(mock_generate_conversation_assessment: AsyncMock, client, sample_scenario_data, sample_conversation):
+def test_assessment_endpoint(mock_generate_conversation_assessment: AsyncMock, client, sample_scenario_data_mutable, sample_conversation):
     """
     Test generating an assessment for a conversation.
     
@@ -110,7 +113,7 @@ def test_assessment_endpoint(mock_generate_conversation_assessment: AsyncMock, c
     a conversation history and returns structured feedback. This tests the
     integration between the API layer and the assessment service.
     """
-    scenario_id = create_scenario(sample_scenario_data)
+    scenario_id = create_scenario(sample_scenario_data_mutable)
     assert scenario_id in scenarios_db, f"Scenario {scenario_id} NOT found in scenarios_db immediately after creation!"
     
     
@@ -166,4 +169,61 @@ def test_assessment_nonexistent_scenario(client):
     response = client.post(f"/api/v1/conversation/{nonexistent_id}/assess")
     
     # Should handle missing scenarios appropriately
-    assert response.status_code == status.HTTP_404_NOT_FOUND
\ No newline at end of file
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_chat_batch_endpoint(client, monkeypatch):
+    """
+    Test generating responses for a batch of prompts in one request.
+    
+    Reasoning: Pipeline clients rely on responses coming back in prompt order,
+    with None marking a prompt whose generation failed.
+    """
+    async def fake_generate(prompt):
+        if prompt == "boom":
+            raise RuntimeError("generation failed")
+        return MagicMock(text=f"echo: {prompt}")
+    
+    monkeypatch.setattr(client.app.state, "chat_model", AsyncMock())
+    client.app.state.chat_model.generate_content_async.side_effect = fake_generate
+    
+    response = client.post("/api/v1/chat_batch", json={"prompts": ["one", "boom", "two"]})
+    
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"responses": ["echo: one", None, "echo: two"]}
+
+def test_chat_batch_too_many_prompts(client):
+    """Test that a batch over CHAT_BATCH_MAX_PROMPTS is rejected with a 422."""
+    prompts = ["hi"] * (settings.CHAT_BATCH_MAX_PROMPTS + 1)
+    response = client.post("/api/v1/chat_batch", json={"prompts": prompts})
+    
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@patch('backend.app.api.routes.chat.build_chat_prompt', new_callable=AsyncMock)
+def test_process_chat_stream_endpoint(mock_build_prompt: AsyncMock, client, monkeypatch, sample_scenario_data_mutable, sample_chat_message):
+    """
+    Test streaming a chat response.
+    
+    Reasoning: The client must receive the chunks in order, and the full response
+    must be recorded in the conversation history once the stream ends.
+    """
+    scenario_id = create_scenario(sample_scenario_data_mutable)
+    mock_build_prompt.return_value = "final prompt"
+    
+    async def fake_stream():
+        for text in ["Hey ", "there"]:
+            yield MagicMock(text=text)
+    
+    monkeypatch.setattr(client.app.state, "chat_model", AsyncMock())
+    client.app.state.chat_model.generate_content_async.return_value = fake_stream()
+    
+    response = client.post(
+        "/api/v1/process_chat_stream",
+        json={"scenario_id": scenario_id, "user_input": sample_chat_message["content"]}
+    )
+    
+    assert response.status_code == status.HTTP_200_OK
+    assert response.text == "Hey there"
+    client.app.state.chat_model.generate_content_async.assert_awaited_once_with("final prompt", stream=True)
+    history = scenarios_db[scenario_id]["conversation_history"]
+    assert history[-1] == {"role": "assistant", "content": "Hey there"}
@@ -10,7 +10,6 @@ from fastapi import FastAPI
 from backend.app import lifespan, create_application
 
 
-@pytest.mark.asyncio
 async def test_lifespan_with_failed_model_initialization():
     """
     Test application initialization when model initialization fails.
@@ -43,7 +42,6 @@ async def test_lifespan_with_failed_model_initialization():
             assert app.state.chat_model is None
 
 
-@pytest.mark.asyncio
 async def test_partial_initialization():
     """
     Test application initialization when only some components initialize.
@@ -62,19 +60,17 @@ async def test_partial_initialization():
     
     @asynccontextmanager
     async def test_lifespan_wrapper():
-        with patch('backend.app.genai', mock_genai), \
-             patch('backend.app.get_api_key_or_raise') as mock_get_key, \
-             patch('backend.app.services.vector_store.initialize_chroma_client') as mock_init_chroma:
-            
-            # Make only the first API key succeed, second one fail
-            mock_get_key.side_effect = [
-                "fake-api-key",  # First call succeeds (chat model)
-                Exception("Embedding API Key not found")  # Second call fails (embedding model)
-            ]
-            
-            # Make ChromaDB initialization succeed
-            mock_client = MagicMock()
-            mock_init_chroma.return_value = mock_client
+        # Make only the first API key succeed, second one fail
+        mock_get_key = MagicMock(side_effect=[
+            "fake-api-key",  # First call succeeds (chat model)
+            Exception("Embedding API Key not found")  # Second call fails (embedding model)
+        ])
+        
+        # Make ChromaDB initialization succeed
+        mock_client = MagicMock()
+        
+        with patch.multiple('backend.app', genai=mock_genai, get_api_key_or_raise=mock_get_key), \
+             patch('backend.app.services.vector_store.initialize_chroma_client', return_value=mock_client):
             
             # Call the actual lifespan
             async with lifespan(app):
@@ -87,44 +83,35 @@ async def test_partial_initialization():
             assert app.state.chroma_client is not None
 
 
-def test_create_application():
+def test_create_application(app_factory_mocks):
     """
     Test application factory function.
     
     This verifies that the application factory function creates a valid
     FastAPI application with appropriate middleware and routes.
     """
-    # Mock dependencies including settings
-    with patch('backend.app.FastAPI') as mock_fastapi_class, \
-         patch('backend.app.api.api_router') as mock_router, \
-         patch('backend.app.settings') as mock_settings:
-        
-        # Configure mock settings
-        mock_settings.API_V1_STR = '/api/v1'
-        mock_settings.PROJECT_NAME = 'Test Project'
-        mock_settings.BACKEND_CORS_ORIGINS = ['http://localhost:3000']
-        
-        # Configure FastAPI mock to return a mock app
-        mock_app = MagicMock()
-        mock_fastapi_class.return_value = mock_app
-        
-        # Call the factory function
-        app = create_application()
-        
-        # Verify FastAPI was instantiated with lifespan
-        mock_fastapi_class.assert_called_once()
-        assert 'lifespan' in mock_fastapi_class.call_args[1]
-        assert mock_fastapi_class.call_args[1]['lifespan'] == lifespan
-        
-        # Verify CORS middleware was added
-        mock_app.add_middleware.assert_called_once()
-        
-        # Verify API router was included
-        mock_app.include_router.assert_called_once()
-        # Check router args and prefix
-        router_args = mock_app.include_router.call_args[0]
-        router_kwargs = mock_app.include_router.call_args[1]
-        assert router_args[0] == mock_router
-        assert router_kwargs['prefix'] == '/api/v1' 
+    mock_fastapi_class = app_factory_mocks['FastAPI']
+    mock_app = app_factory_mocks['app']
+    mock_router = app_factory_mocks['api_router']
+    
+    # Call the factory function
+    app = create_application()
+    
+    # Verify FastAPI was instantiated with lifespan
+    mock_fastapi_class.assert_called_once()
+    assert 'lifespan' in mock_fastapi_class.call_args[1]
+    assert mock_fastapi_class.call_args[1]['lifespan'] == lifespan
+    
+    # Verify CORS middleware was added
+    mock_app.add_middleware.assert_called_once()
+    
+    # Verify API router was included
+    mock_app.include_router.assert_called_once()
+    # Check router args and prefix
+    router_args = mock_app.include_router.call_args[0]
+    router_kwargs = mock_app.include_router.call_args[1]
+    assert router_args[0] == mock_router
+    assert router_kwargs['prefix'] == '/api/v1'
+
 
     
\ No newline at end of file
@@ -2,7 +2,6 @@
 Tests for the assessment service functionality.
 """
 import pytest
-import json
 from unittest.mock import AsyncMock, patch, MagicMock
 from backend.app.services.assessments import (
     format_assessment_prompt,
@@ -12,20 +11,14 @@ from backend.app.services.assessments import (
 )
 from backend.app.utils.cleaner import clean_gemini_output
 from backend.tests import SAMPLE_SCENARIO, SAMPLE_MESSAGES
-from backend.data import ARCHETYPES_FILE
 
-@pytest.mark.asyncio
-async def test_load_archetype_definitions():
+async def test_load_archetype_definitions(fresh_archetypes_bundle):
     """
     Test loading and formatting archetype definitions.
 
     Reasoning: Verifies that archetype definitions are loaded from the source
     and formatted correctly into a string for the prompt.
     """
-    # Ensure the archetypes file exists first
-    import os
-    assert os.path.exists(ARCHETYPES_FILE)
-    
     definitions = await load_archetype_definitions()
     
     assert isinstance(definitions, str)
@@ -35,17 +28,13 @@ async def test_load_archetype_definitions():
     assert "NPC Vibes" in definitions
     assert ":" in definitions # Check for key: description format
 
-@pytest.mark.asyncio
-async def test_load_conversation_aspects():
+async def test_load_conversation_aspects(fresh_archetypes_bundle):
     """
     Test loading and formatting conversation aspects.
 
     Reasoning: Verifies that conversation aspects are loaded and formatted
     correctly, including descriptions and good/bad examples, for the prompt.
     """
-    import os
-    assert os.path.exists(ARCHETYPES_FILE)
-    
     aspects = await load_conversation_aspects()
     
     assert isinstance(aspects, str)
@@ -55,7 +44,6 @@ async def test_load_conversation_aspects():
     assert "Good:" in aspects
     assert "Bad:" in aspects
 
-@pytest.mark.asyncio
 async def test_format_assessment_prompt():
     """
     Test the formatting of the assessment prompt.
@@ -88,26 +76,43 @@ async def test_format_assessment_prompt():
         assert SAMPLE_MESSAGES[0]["content"] in formatted_prompt
         assert SAMPLE_MESSAGES[1]["content"] in formatted_prompt
 
-@pytest.mark.asyncio
-async def test_generate_assessment_success():
+@pytest.mark.parametrize("raw_response,cleaner_return,llm_error,expected_status,expected_error_fragment", [
+    pytest.param(
+        "{\"primary_archetype\": \"Rizz God\", \"strengths\": \"Good flow\"}",
+        {"primary_archetype": "Rizz God", "strengths": "Good flow"},
+        None, "success", None,
+        id="success"
+    ),
+    pytest.param(
+        "This is not JSON { definitely not parsable",
+        None,
+        None, "error", "Failed to parse assessment response",
+        id="parse_fail"
+    ),
+    pytest.param(
+        None,
+        None,
+        Exception("LLM API Error"), "error", "LLM API Error",
+        id="llm_error"
+    ),
+])
+async def test_generate_conversation_assessment_paths(raw_response, cleaner_return, llm_error, expected_status, expected_error_fragment, mock_chat_model_factory):
     """
-    Test successful generation and parsing of an assessment.
+    Test assessment generation on the success, parsing failure and LLM error paths.
 
-    Reasoning: Verifies the happy path: prompt is formatted, LLM responds with
-    valid JSON-like text, cleaner parses it, and a successful result is returned.
+    Reasoning: The happy path must return the parsed assessment. A malformed LLM
+    response must return an error that keeps the raw text, and an LLM failure
+    must be caught and reported rather than raised.
     """
     mock_prompt = "Formatted assessment prompt"
-    mock_raw_llm_response = "{\"primary_archetype\": \"Rizz God\", \"strengths\": \"Good flow\"}" # Simplified JSON string
-    mock_parsed_assessment = {"primary_archetype": "Rizz God", "strengths": "Good flow"}
     
     # Mock dependencies
-    mock_chat_model = AsyncMock()
-    mock_chat_model.generate_content_async.return_value = AsyncMock(text=mock_raw_llm_response)
+    mock_chat_model = mock_chat_model_factory(text=raw_response, side_effect=llm_error)
     
     with patch('backend.app.services.assessments.format_assessment_prompt', 
                return_value=mock_prompt) as mock_format,\
          patch('backend.app.services.assessments.clean_gemini_output', 
-               return_value=mock_parsed_assessment) as mock_cleaner:
+               return_value=cleaner_return) as mock_cleaner:
         
         result = await generate_conversation_assessment(
             conversation_history=SAMPLE_MESSAGES,
@@ -118,76 +123,29 @@ async def test_generate_assessment_success():
         # Assertions
         mock_format.assert_awaited_once_with(SAMPLE_MESSAGES, SAMPLE_SCENARIO)
         mock_chat_model.generate_content_async.assert_awaited_once_with(mock_prompt)
-        mock_cleaner.assert_called_once_with(mock_raw_llm_response)
+        assert result.get("status") == expected_status
         
-        assert result.get("status") == "success"
-        assert "assessment" in result
-        # Compare assessment content
-        assert result["assessment"]["primary_archetype"] == mock_parsed_assessment["primary_archetype"]
-        assert result["assessment"]["strengths"] == mock_parsed_assessment["strengths"]
-
-@pytest.mark.asyncio
-async def test_generate_assessment_parsing_failure():
-    """
-    Test handling of LLM response parsing failure.
-
-    Reasoning: Ensures that if the LLM response is malformed and the cleaner fails,
-    the function returns a proper error status and includes the raw text.
-    """
-    mock_prompt = "Formatted assessment prompt for parsing failure"
-    mock_raw_llm_response = "This is not JSON { definitely not parsable" 
-    
-    # Mock dependencies
-    mock_chat_model = AsyncMock()
-    mock_chat_model.generate_content_async.return_value = AsyncMock(text=mock_raw_llm_response)
-    
-    # Mock cleaner to return None, simulating parsing failure
-    with patch('backend.app.services.assessments.format_assessment_prompt', 
-               return_value=mock_prompt),\
-         patch('backend.app.services.assessments.clean_gemini_output', 
-               return_value=None) as mock_cleaner:
+        if llm_error:
+            mock_cleaner.assert_not_called()
+        else:
+            mock_cleaner.assert_called_once_with(raw_response)
         
-        result = await generate_conversation_assessment(
-            conversation_history=SAMPLE_MESSAGES,
-            scenario_data=SAMPLE_SCENARIO,
-            chat_model=mock_chat_model
-        )
-        
-        # Assertions
-        mock_cleaner.assert_called_once_with(mock_raw_llm_response)
-        assert result.get("status") == "error"
-        assert "error" in result
-        assert "Failed to parse assessment response" in result.get("error")
-        assert "raw_text_response" in result
-        assert result["raw_text_response"] == mock_raw_llm_response # Check raw text is preserved
+        if expected_status == "success":
+            assert result["assessment"]["primary_archetype"] == cleaner_return["primary_archetype"]
+            assert result["assessment"]["strengths"] == cleaner_return["strengths"]
+        else:
+            assert expected_error_fragment in result.get("error")
+            # raw_text should be accessible but could be None (depending on when error occurs)
+            assert "raw_text_response" in result
+            if raw_response is not None:
+                assert result["raw_text_response"] == raw_response
 
-@pytest.mark.asyncio
-async def test_generate_assessment_llm_error():
+def test_clean_gemini_output_strips_fences():
     """
-    Test handling of errors during LLM interaction.
-
-    Reasoning: Verifies that if the call to the LLM fails (e.g., network issue),
-    the exception is caught and an appropriate error result is returned.
+    Test that markdown fences and whitespace are stripped before parsing.
     """
-    mock_prompt = "Formatted assessment prompt for LLM error"
-    llm_error = Exception("LLM API Error")
-    
-    # Mock dependencies
-    mock_chat_model = AsyncMock()
-    mock_chat_model.generate_content_async.side_effect = llm_error # Make LLM call raise an error
-    
-    with patch('backend.app.services.assessments.format_assessment_prompt', 
-               return_value=mock_prompt):
-        
-        result = await generate_conversation_assessment(
-            conversation_history=SAMPLE_MESSAGES,
-            scenario_data=SAMPLE_SCENARIO,
-            chat_model=mock_chat_model
-        )
-        
-        # Assertions
-        assert result.get("status") == "error"
-        assert "error" in result
-        assert str(llm_error) in result.get("error") # Check original error is in message
-        # raw_text should be accessible but could be None (depending on when error occurs)
-        assert "raw_text_response" in result
+    assert clean_gemini_output('```json\n{"overall_score": 7}\n```') == {"overall_score": 7}
+    assert clean_gemini_output('```\n[1, 2]\n```') == [1, 2]
+    assert clean_gemini_output('  {"a": "x```y"}  ') == {"a": "x```y"}
+    assert clean_gemini_output('```json {"a": 1}') == {"a": 1}
+    assert clean_gemini_output("not json") is None
@@ -2,24 +2,36 @@
 Tests for the chat service functionality.
 """
 import pytest
-import json
+import asyncio
 from unittest.mock import AsyncMock, patch, MagicMock
-from backend.app.services import format_chat_prompt, process_chat
-from backend.tests import SAMPLE_SCENARIO, SAMPLE_MESSAGES
+from backend.app.services import format_chat_prompt, process_chat, stream_chat, ConcurrencyLimitedModel
+from backend.tests import SAMPLE_SCENARIO, SAMPLE_MESSAGES, make_scenario
 
-@pytest.mark.asyncio
-async def test_process_chat_basic():
+@pytest.mark.parametrize("with_vector_service,model_text,model_error,expected_status,expected_fragment", [
+    pytest.param(False, "Test response", None, "success", "Test response", id="basic"),
+    pytest.param(True, "Test response with examples", None, "success", "Test response with examples", id="vector_service"),
+    pytest.param(False, None, Exception("Test error"), "error", "Test error", id="model_error"),
+])
+async def test_process_chat_paths(with_vector_service, model_text, model_error, expected_status, expected_fragment, mock_chat_model_factory):
     """
-    Test basic chat processing without vector service.
+    Test chat processing with and without the vector service, and when the model fails.
     
-    Reasoning: This test verifies the core chat processing functionality without the
-    vector retrieval component. It confirms that the process_chat function can properly
-    format prompts and generate responses using the AI model. This is the most fundamental
-    operation of the chat system.
+    Reasoning: The core path must format the prompt and return the model's response.
+    With a vector service, examples must be requested before generating. An AI model
+    failure must come back as an error result rather than an exception.
     """
     # Mock dependencies
-    mock_chat_model = AsyncMock()
-    mock_chat_model.generate_content_async.return_value = AsyncMock(text="Test response")
+    mock_chat_model = mock_chat_model_factory(text=model_text, side_effect=model_error)
+    
+    mock_vector_service = None
+    if with_vector_service:
+        mock_vector_service = AsyncMock()
+        mock_vector_service.retrieve_relevant_examples.return_value = {
+            "ids": [["id1", "id2"]],
+            "metadatas": [[{"meta1": "value1"}, {"meta2": "value2"}]],
+            "documents": [["doc1 content", "doc2 content"]],
+            "distances": [[0.1, 0.2]]
+        }
     
     # Process chat
     result = await process_chat(
@@ -28,38 +40,36 @@ async def test_process_chat_basic():
         scenario_data=SAMPLE_SCENARIO,
         conversation_history=SAMPLE_MESSAGES,
         chat_model=mock_chat_model,
-        vector_service=None  # No vector service
+        vector_service=mock_vector_service
     )
     
     # Assertions
     assert mock_chat_model.generate_content_async.called
-    assert result.get("status") == "success"
-    assert result.get("response") == "Test response"
-    
+    assert result.get("status") == expected_status
+    if with_vector_service:
+        assert mock_vector_service.retrieve_relevant_examples.called
+    if expected_status == "success":
+        assert result.get("response") == expected_fragment
+    else:
+        assert expected_fragment in result.get("error")
 
-@pytest.mark.asyncio
-async def test_process_chat_with_vector_service():
+async def test_process_chat_with_qdrant_examples(mock_chat_model_factory):
     """
-    Test chat processing with vector service integration.
-    
-    Reasoning: This test ensures that the process_chat function properly integrates
-    with the vector service for retrieving relevant examples. It verifies that examples
-    are requested from the vector service and incorporated into the prompt. This tests
-    the integration between two important components of the system.
+    Test that examples in the flat Qdrant result shape reach the prompt.
+
+    Reasoning: VectorService returns Qdrant's flat ids/payloads/documents lists,
+    not the nested per-query lists, and those examples must not be dropped.
     """
-    # Mock dependencies
-    mock_chat_model = AsyncMock()
-    mock_chat_model.generate_content_async.return_value = AsyncMock(text="Test response with examples")
-    
+    mock_chat_model = mock_chat_model_factory(text="Test response")
+
     mock_vector_service = AsyncMock()
     mock_vector_service.retrieve_relevant_examples.return_value = {
-        "ids": [["id1", "id2"]],
-        "metadatas": [[{"meta1": "value1"}, {"meta2": "value2"}]],
-        "documents": [["doc1 content", "doc2 content"]],
-        "distances": [[0.1, 0.2]]
+        "ids": ["id1"],
+        "scores": [0.9],
+        "payloads": [{"text": "qdrant doc content", "tone": "playful"}],
+        "documents": ["qdrant doc content"]
     }
-    
-    # Process chat
+
     result = await process_chat(
         user_input="Hello with examples",
         scenario_id="test-scenario-456",
@@ -68,49 +78,130 @@ async def test_process_chat_with_vector_service():
         chat_model=mock_chat_model,
         vector_service=mock_vector_service
     )
-    
-    # Assertions
-    assert mock_vector_service.retrieve_relevant_examples.called
-    assert mock_chat_model.generate_content_async.called
+
     assert result.get("status") == "success"
-    assert result.get("response") == "Test response with examples"
-    
+    prompt = mock_chat_model.generate_content_async.call_args[0][0]
+    assert '{"tone":"playful"}: qdrant doc content' in prompt
+
 
-@pytest.mark.asyncio
-async def test_process_chat_error_handling():
+async def test_process_chat_response_cache_hit(mock_chat_model_factory):
     """
-    Test error handling during chat processing.
-    
-    Reasoning: This test verifies that the process_chat function properly handles
-    errors that might occur during processing, such as AI model failures or prompt
-    formatting issues. Proper error handling is essential for system reliability.
+    Test that a cached response skips the model call.
+
+    Reasoning: The response cache exists to avoid the Gemini round trip for
+    near-duplicate prompts, so a hit must be returned as-is without generating.
     """
-    # Mock dependencies with error behavior
-    mock_chat_model = AsyncMock()
-    mock_chat_model.generate_content_async.side_effect = Exception("Test error")
-    
-    # Process chat
+    from backend.app.services import ResponseCache
+
+    mock_chat_model = mock_chat_model_factory()
+    mock_qdrant = MagicMock()
+    mock_qdrant.search.return_value = [MagicMock(payload={"response": "Cached response"})]
+    mock_embedder = AsyncMock()
+    mock_embedder.embed.return_value = [0.1, 0.2, 0.3]
+
     result = await process_chat(
-        user_input="This will cause an error",
-        scenario_id="test-scenario-789",
+        user_input="Hello",
+        scenario_id="test-scenario-123",
         scenario_data=SAMPLE_SCENARIO,
         conversation_history=SAMPLE_MESSAGES,
         chat_model=mock_chat_model,
-        vector_service=None
+        vector_service=None,
+        response_cache=ResponseCache(mock_qdrant, "llm_response_cache", embedder=mock_embedder)
     )
-    
-    # Assertions
-    assert result.get("status") == "error"
-    assert "error" in result
-    assert "Test error" in result.get("error")
 
-@pytest.mark.asyncio
+    assert result.get("status") == "success"
+    assert result.get("response") == "Cached response"
+    mock_chat_model.generate_content_async.assert_not_called()
+    mock_qdrant.upsert.assert_not_called()
+
+async def test_process_chat_response_cache_scoped_to_scenario(mock_chat_model_factory):
+    """
+    Test that a response cached for one scenario is not served to another.
+
+    Reasoning: Prompts from different conversations can embed almost identically,
+    so a hit must also match the scenario and user message it was stored under.
+    """
+    from backend.app.services import ResponseCache
+
+    stored_points = []
+
+    def fake_search(query_filter=None, **kwargs):
+        scopes = [c.match.value for c in query_filter.must if c.key == "scope"]
+        return [
+            MagicMock(payload=point.payload) for point in stored_points
+            if point.payload.get("scope") in scopes
+        ]
+
+    mock_qdrant = MagicMock()
+    mock_qdrant.search.side_effect = fake_search
+    mock_qdrant.upsert.side_effect = lambda points, **kwargs: stored_points.extend(points)
+    mock_embedder = AsyncMock()
+    mock_embedder.embed.return_value = [0.1, 0.2, 0.3]
+    response_cache = ResponseCache(mock_qdrant, "llm_response_cache", embedder=mock_embedder)
+
+    for scenario_id, model_text in [("scenario-a", "Reply for A"), ("scenario-b", "Reply for B")]:
+        result = await process_chat(
+            user_input="Hello",
+            scenario_id=scenario_id,
+            scenario_data=SAMPLE_SCENARIO,
+            conversation_history=SAMPLE_MESSAGES,
+            chat_model=mock_chat_model_factory(model_text),
+            vector_service=None,
+            response_cache=response_cache
+        )
+        assert result.get("response") == model_text
+
+    assert len(stored_points) == 2
+
+    # The same scenario and message still hit the cache
+    repeat_model = mock_chat_model_factory("Fresh reply")
+    result = await process_chat(
+        user_input="Hello",
+        scenario_id="scenario-a",
+        scenario_data=SAMPLE_SCENARIO,
+        conversation_history=SAMPLE_MESSAGES,
+        chat_model=repeat_model,
+        vector_service=None,
+        response_cache=response_cache
+    )
+    assert result.get("response") == "Reply for A"
+    repeat_model.generate_content_async.assert_not_called()
+
+async def test_stream_chat_holds_concurrency_slot_until_done():
+    """
+    Test that a streamed response keeps its concurrency slot until it is consumed or closed.
+
+    Reasoning: generate_content_async returns before any chunk is read, so releasing
+    the slot on return would leave streaming calls outside GEMINI_CONCURRENCY.
+    """
+    async def fake_stream():
+        for text in ["Hey ", "there"]:
+            yield MagicMock(text=text)
+
+    mock_model = AsyncMock()
+    mock_model.generate_content_async.side_effect = lambda *args, **kwargs: fake_stream()
+    semaphore = asyncio.Semaphore(1)
+    model = ConcurrencyLimitedModel(mock_model, semaphore)
+
+    chunks = stream_chat(model, "prompt")
+    assert await chunks.__anext__() == "Hey "
+    assert semaphore.locked()
+    assert [text async for text in chunks] == ["there"]
+    assert not semaphore.locked()
+
+    # A client that stops reading early also frees the slot
+    chunks = stream_chat(model, "prompt")
+    assert await chunks.__anext__() == "Hey "
+    assert semaphore.locked()
+    await chunks.aclose()
+    assert not semaphore.locked()
+
 @pytest.mark.parametrize("archetype,roast_level", [
     ("The Icy One", 1),
     ("The Awkward Sweetheart", 3),
     ("The Certified Baddie", 5)
 ])
-async def test_different_archetypes_and_roast_levels(archetype, roast_level):
+async def test_different_archetypes_and_roast_levels(archetype, roast_level, mock_chat_model_factory):
     """
     Test chat processing with different archetypes and roast levels.
     
@@ -120,13 +211,10 @@ async def test_different_archetypes_and_roast_levels(archetype, roast_level):
     into prompts, influencing the AI's response style.
     """
     # Create a modified scenario with the parametrized values
-    modified_scenario = SAMPLE_SCENARIO.copy()
-    modified_scenario["system_archetype"] = archetype
-    modified_scenario["roast_level"] = roast_level
+    modified_scenario = make_scenario(system_archetype=archetype, roast_level=roast_level)
     
     # Mock dependencies
-    mock_chat_model = AsyncMock()
-    mock_chat_model.generate_content_async.return_value = AsyncMock(text=f"Response for {archetype} at level {roast_level}")
+    mock_chat_model = mock_chat_model_factory(text=f"Response for {archetype} at level {roast_level}")
     
     # Process chat
     result = await process_chat(
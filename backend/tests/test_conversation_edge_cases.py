@@ -8,11 +8,19 @@ from backend.app.services.scenarios import (
     create_scenario,
     get_scenario,
     add_conversation_message,
+    add_conversation_messages,
     get_conversation_history
 )
+from backend.app.api.routes.assessment import get_conversation_assessment
+
+# 100 alternating user/assistant turns, built once for the module
+MANY_MESSAGES = tuple(
+    {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}"}
+    for i in range(100)
+)
 
 
-def test_nonexistent_scenario_access():
+def test_nonexistent_scenario_access(monkeypatch):
     """
     Test access to a non-existent scenario.
     
@@ -20,13 +28,14 @@ def test_nonexistent_scenario_access():
     to access scenarios that don't exist.
     """
     # Mock the scenarios_db dictionary to be empty
-    with patch('backend.app.services.scenarios.scenarios_db', {}):
-        # Attempt to get a scenario that doesn't exist
-        scenario = get_scenario("nonexistent-id")
-        assert scenario is None
+    monkeypatch.setattr('backend.app.services.scenarios.scenarios_db', {})
+    
+    # Attempt to get a scenario that doesn't exist
+    scenario = get_scenario("nonexistent-id")
+    assert scenario is None
 
 
-def test_very_long_conversation_history():
+def test_very_long_conversation_history(monkeypatch):
     """
     Test handling of very long conversation histories.
     
@@ -43,26 +52,20 @@ def test_very_long_conversation_history():
         }
     }
     
-    # Generate a large number of messages (100)
-    many_messages = [
-        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}"}
-        for i in range(100)
-    ]
+    monkeypatch.setattr('backend.app.services.scenarios.scenarios_db', mock_db)
     
-    with patch('backend.app.services.scenarios.scenarios_db', mock_db):
-        # Add all messages to the conversation
-        for message in many_messages:
-            success = add_conversation_message(scenario_id, message)
-            assert success is True
-        
-        # Retrieve the conversation history
-        history = get_conversation_history(scenario_id)
-        assert len(history) == 100
-        assert history[0]["content"] == "Message 0"
-        assert history[99]["content"] == "Message 99"
+    # Add all messages to the conversation in one call
+    success = add_conversation_messages(scenario_id, MANY_MESSAGES)
+    assert success is True
+    
+    # Retrieve the conversation history
+    history = get_conversation_history(scenario_id)
+    assert len(history) == 100
+    assert history[0]["content"] == "Message 0"
+    assert history[99]["content"] == "Message 99"
 
 
-def test_malformed_message_handling():
+def test_malformed_message_handling(monkeypatch):
     """
     Test handling of malformed messages in conversation history.
     
@@ -79,26 +82,26 @@ def test_malformed_message_handling():
         }
     }
     
-    with patch('backend.app.services.scenarios.scenarios_db', mock_db):
-        # Test adding messages with missing fields
-        malformed_messages = [
-            {},  # Empty message
-            {"role": "user"},  # Missing content
-            {"content": "Hello"},  # Missing role
-            {"role": "invalid", "content": "Test"}  # Invalid role
-        ]
-        
-        for message in malformed_messages:
-            # Should still succeed even with malformed messages
-            success = add_conversation_message(scenario_id, message)
-            assert success is True
-        
-        # Verify all messages were added
-        history = get_conversation_history(scenario_id)
-        assert len(history) == 4
+    monkeypatch.setattr('backend.app.services.scenarios.scenarios_db', mock_db)
+    
+    # Test adding messages with missing fields
+    malformed_messages = [
+        {},  # Empty message
+        {"role": "user"},  # Missing content
+        {"content": "Hello"},  # Missing role
+        {"role": "invalid", "content": "Test"}  # Invalid role
+    ]
+    
+    for message in malformed_messages:
+        # Should still succeed even with malformed messages
+        success = add_conversation_message(scenario_id, message)
+        assert success is True
+    
+    # Verify all messages were added
+    history = get_conversation_history(scenario_id)
+    assert len(history) == 4
 
 
-@pytest.mark.asyncio
 async def test_empty_conversation_assessment():
     """
     Test attempting to assess an empty conversation.
@@ -106,8 +109,6 @@ async def test_empty_conversation_assessment():
     This verifies that the application properly handles attempts
     to generate assessments for conversations with no messages.
     """
-    from backend.app.api.routes.assessment import get_conversation_assessment
-    
     # Mock dependencies
     request = MagicMock()
     request.app.state.chat_model = MagicMock()
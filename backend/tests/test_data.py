@@ -6,7 +6,6 @@ import asyncio
 import os
 from backend.data import (
     load_archetypes,
-    load_archetypes_async,
     ARCHETYPES_FILE
 )
 from backend.app.services import load_archetypes_data
@@ -34,22 +33,7 @@ def test_load_archetypes_sync():
     assert len(archetypes["user_archetypes"]) > 0
     assert len(archetypes["conversation_aspects"]) > 0
 
-@pytest.mark.asyncio
-async def test_load_archetypes_async():
-    """Test the asynchronous archetype loading function."""
-    archetypes = await load_archetypes_async()
-    
-    # Verify the structure
-    assert isinstance(archetypes, dict)
-    assert len(archetypes) > 0
-    
-    # Check for expected keys
-    assert "system_archetypes" in archetypes
-    assert "user_archetypes" in archetypes
-    assert "conversation_aspects" in archetypes
-
-@pytest.mark.asyncio
-async def test_service_archetypes_loader():
+async def test_service_archetypes_loader(archetypes_json):
     """Test the service's archetype loading function."""
     archetypes = await load_archetypes_data()
     
@@ -63,7 +47,7 @@ async def test_service_archetypes_loader():
     assert "conversation_aspects" in archetypes
     
     # Ensure both loading methods return the same data
-    sync_archetypes = load_archetypes()
+    sync_archetypes = archetypes_json
     assert archetypes.keys() == sync_archetypes.keys()
     
     # Check some sample values to confirm they're identical
@@ -7,7 +7,9 @@ from backend.app.services import (
     create_scenario,
     get_scenario,
     add_conversation_message,
+    add_conversation_messages,
     get_conversation_history,
+    get_formatted_history,
     generate_scenario_id
 )
 from backend.tests import SAMPLE_SCENARIO, SAMPLE_MESSAGES
@@ -23,35 +25,26 @@ def test_scenario_id_generation():
     
     # Timestamp should be numeric
     assert parts[1].isdigit()
-    
-    return scenario_id
 
-def test_scenario_creation_and_retrieval():
+def test_scenario_creation_and_retrieval(created_scenario_id):
     """Test creating and retrieving a scenario."""
-    # Create scenario using common test data
-    scenario_id = create_scenario(SAMPLE_SCENARIO)
-    
     # Verify ID format
-    assert scenario_id.startswith("conversation-")
+    assert created_scenario_id.startswith("conversation-")
     
     # Retrieve scenario
-    retrieved_scenario = get_scenario(scenario_id)
+    retrieved_scenario = get_scenario(created_scenario_id)
     
     # Verify data matches
     for key, value in SAMPLE_SCENARIO.items():
         assert retrieved_scenario.get(key) == value
-        
-    return scenario_id
 
-def test_conversation_messages():
+def test_conversation_messages(created_scenario_id):
     """Test adding and retrieving conversation messages."""
-    # Create a scenario first
-    scenario_id = test_scenario_creation_and_retrieval()
+    scenario_id = created_scenario_id
     
-    # Add messages from common test data
-    for message in SAMPLE_MESSAGES:
-        success = add_conversation_message(scenario_id, message)
-        assert success is True
+    # Add messages from common test data in one call
+    success = add_conversation_messages(scenario_id, [dict(message) for message in SAMPLE_MESSAGES])
+    assert success is True
     
     # Retrieve conversation history
     history = get_conversation_history(scenario_id)
@@ -73,4 +66,26 @@ def test_nonexistent_scenario():
     assert success is False
     
     history = get_conversation_history(nonexistent_id)
-    assert history == [] 
\ No newline at end of file
+    assert history == [] 
+
+def test_formatted_history_tracks_messages():
+    """Test that the preformatted history matches formatting the full history."""
+    scenario_id = create_scenario(dict(SAMPLE_SCENARIO))
+    for message in SAMPLE_MESSAGES:
+        add_conversation_message(scenario_id, dict(message))
+    
+    expected = "\n".join(f"{m['role']}: {m['content']}" for m in SAMPLE_MESSAGES)
+    assert get_formatted_history(scenario_id) == expected
+    assert get_formatted_history("conversation-99999999-nonexistent") is None
+
+def test_formatted_history_rebuilt_when_out_of_sync():
+    """Test that a missing or stale preformatted history is rebuilt from the full history."""
+    from backend.app.services.scenarios import scenarios_db
+    
+    scenario_id = create_scenario(dict(SAMPLE_SCENARIO))
+    add_conversation_message(scenario_id, dict(SAMPLE_MESSAGES[0]))
+    del scenarios_db[scenario_id]["formatted_history"]
+    add_conversation_message(scenario_id, dict(SAMPLE_MESSAGES[1]))
+    
+    expected = "\n".join(f"{m['role']}: {m['content']}" for m in SAMPLE_MESSAGES[:2])
+    assert get_formatted_history(scenario_id) == expected
@@ -3,40 +3,18 @@
 # """
 # import pytest
 # from unittest.mock import patch, MagicMock, AsyncMock
-# from fastapi import FastAPI
-# from fastapi.testclient import TestClient
-# from backend.app import create_application
 # from backend.app.api.models.schema import ScenarioData, ChatInput
 
 
-# @pytest.fixture
-# def print_routes():
-#     """Print all available routes for diagnostic purposes."""
-#     app = create_application()
-    
-#     print("\n--- API ROUTES ---")
-#     for route in app.routes:
-#         methods = [method for method in route.methods] if hasattr(route, "methods") else []
-#         print(f"{route.path} - {methods}")
-#     print("--- END API ROUTES ---\n")
-    
-#     return app
-
-
-# @pytest.fixture
-# def mock_test_client(print_routes):
-#     """Create a test client with properly mocked dependencies."""
-#     # Create the application using the print_routes fixture
-#     app = print_routes
-    
-#     # Initialize app.state with mock objects
-#     app.state.chat_model = AsyncMock()
-#     app.state.embedding_model = MagicMock()
-#     app.state.chroma_collection = MagicMock()
-#     app.state.chroma_client = MagicMock()
-    
-#     # Create and return the test client
-#     return TestClient(app)
+# @pytest.fixture(scope="module")
+# def mock_test_client(client):
+#     """
+#     Reuse the shared test client for the module.
+#     
+#     The app, its routes and its mocked state (chat model, Qdrant client) are
+#     built once per session by the conftest app fixture, so nothing is rebuilt here.
+#     """
+#     return client
 
 
 # def test_input_sanitization(mock_test_client):
@@ -85,20 +63,26 @@
     
 #     # Create a reasonably large input that's likely to be rejected
 #     # (Using 10MB would be too big for most test runners, so we'll use 1MB instead)
-#     large_input = {
-#         "scenario_type": "dating",
-#         "setting": "a" * (1024 * 1024),  # 1MB string
-#         "goal": "first_impression",
-#         "system_archetype": "The Icy One",
-#         "roast_level": 3,
-#         "player_sex": "male",
-#         "system_sex": "female"
-#     }
+#     # The body is streamed in 64KB chunks, so the 1MB setting is never built as one string
+#     chunk = b"a" * (64 * 1024)
+    
+#     def large_input():
+#         yield b'{"scenario_type": "dating", "setting": "'
+#         for _ in range(16):  # 16 x 64KB = 1MB
+#             yield chunk
+#         yield (
+#             b'", "goal": "first_impression", "system_archetype": "The Icy One", '
+#             b'"roast_level": 3, "player_sex": "male", "system_sex": "female"}'
+#         )
     
 #     # Try sending the request - it may fail at various levels
 #     try:
 #         # This will likely fail with some kind of error due to the large size
-#         response = client.post("/api/v1/scenario", json=large_input)
+#         response = client.post(
+#             "/api/v1/scenario",
+#             content=large_input(),
+#             headers={"Content-Type": "application/json"}
+#         )
         
 #         # If we get a response, it should be an error status
 #         print(f"Large input test response status: {response.status_code}")
@@ -8,67 +8,32 @@ from backend.app.services.vector_store import (
     retrieve_relevant_examples
 )
 
+# A very long text (100KB), built once for the module
+LONG_TEXT = "x" * 100_000
 
-def test_empty_text_embedding():
-    """
-    Test embedding generation with empty text.
-    
-    This verifies that the embedding generation functions handle
-    empty text gracefully without crashing.
-    """
-    empty_text = ""
-    
-    # Patch genai.embed_content to return a mock response
-    mock_embedding = [0.0] * 10  # Mock 10-dim embedding of zeros
-    mock_response = {"embedding": mock_embedding}
-    
-    with patch('backend.app.services.vector_store.genai.embed_content', return_value=mock_response):
-        result = generate_embedding(empty_text)
-        assert result is not None
-        assert len(result) == 10
-        assert all(x == 0.0 for x in result)
-
-
-def test_very_long_text_embedding():
-    """
-    Test embedding generation with very long text.
-    
-    This verifies that the embedding generation functions handle
-    extremely long texts without crashing.
-    """
-    # Create a very long text (100KB)
-    very_long_text = "x" * 100000
-    
-    # Patch genai.embed_content to simulate success with long text
-    mock_embedding = [0.1] * 10  # Mock 10-dim embedding
-    mock_response = {"embedding": mock_embedding}
-    
-    with patch('backend.app.services.vector_store.genai.embed_content', return_value=mock_response):
-        result = generate_embedding(very_long_text)
-        assert result is not None
-        assert len(result) == 10
 
-
-def test_special_characters_embedding():
+@pytest.mark.parametrize("text,value", [
+    pytest.param("", 0.0, id="empty"),
+    pytest.param(LONG_TEXT, 0.1, id="very_long"),
+    pytest.param("Test with special chars: ñáéíóú 😊🚀💡 and symbols: &*()[]{}|", 0.2, id="special_characters"),
+])
+def test_generate_embedding_edge_cases(text, value, mock_embed_content):
     """
-    Test embedding generation with special characters and emojis.
+    Test embedding generation with empty, very long and special-character text.
     
     This verifies that the embedding generation functions handle
-    non-standard characters appropriately.
+    these inputs without crashing and return the model's embedding as-is.
     """
-    special_text = "Test with special chars: ñáéíóú 😊🚀💡 and symbols: &*()[]{}|"
-    
-    # Patch genai.embed_content to simulate success with special chars
-    mock_embedding = [0.2] * 10  # Mock 10-dim embedding
-    mock_response = {"embedding": mock_embedding}
+    # Mock 10-dim embedding
+    mock_embed_content.return_value = {"embedding": [value] * 10}
     
-    with patch('backend.app.services.vector_store.genai.embed_content', return_value=mock_response):
-        result = generate_embedding(special_text)
-        assert result is not None
-        assert len(result) == 10
+    result = generate_embedding(text)
+    assert result is not None
+    assert len(result) == 10
+    assert all(x == value for x in result)
+    assert mock_embed_content.call_args[1]["content"] == text
 
 
-@pytest.mark.asyncio
 async def test_empty_vector_database():
     """
     Test retrieval from an empty vector database.
@@ -99,4 +64,33 @@ async def test_empty_vector_database():
         assert len(results["ids"]) == 0  # Qdrant returns an empty list, not a list with an empty list
         
         # Verify that the search method was called with correct parameters
-        mock_client.search.assert_called_once()
\ No newline at end of file
+        mock_client.search.assert_called_once()
+
+def test_query_text_omits_empty_sections():
+    """
+    Test that empty history and scenario sections are left out of the query text.
+    
+    This verifies that the retrieval query embedding isn't padded with
+    empty [History: ] / [Scenario: ] markers.
+    """
+    mock_client = MagicMock()
+    mock_client.search.return_value = []
+    
+    with patch('backend.app.services.vector_store.generate_embedding', return_value=[0.1] * 10) as mock_embed:
+        retrieve_relevant_examples(
+            client=mock_client,
+            collection_name="test_collection",
+            user_input="test query",
+            conversation_history=[{"role": "user", "content": ""}],
+            scenario={}
+        )
+        assert mock_embed.call_args[0][0] == "test query"
+        
+        retrieve_relevant_examples(
+            client=mock_client,
+            collection_name="test_collection",
+            user_input="test query",
+            conversation_history=[{"role": "user", "content": "hey"}],
+            scenario={"type": "test"}
+        )
+        assert mock_embed.call_args[0][0] == "test query [History: hey] [Scenario: type:test]"
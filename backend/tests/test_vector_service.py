@@ -3,14 +3,19 @@ Tests for the vector service functionality.
 """
 import pytest
 import os
+import json
 from unittest.mock import MagicMock, AsyncMock, patch
 from backend.app.services.vector_service import VectorService
 from backend.app.services.vector_store import (
     initialize_embedding_model,
     initialize_qdrant_client,
     get_or_create_collection,
+    begin_bulk_ingest,
+    finalize_ingest,
     generate_embedding,
     store_document,
+    flush_documents,
+    process_and_store_blocks,
     retrieve_relevant_examples
 )
 from backend.tests import SAMPLE_SCENARIO, SAMPLE_MESSAGES
@@ -102,12 +107,36 @@ def test_get_or_create_collection_failure():
     collection = get_or_create_collection(mock_client, "test_collection")
     assert collection is None
 
+def test_bulk_ingest_mode():
+    """
+    Test pausing and restoring indexing around a bulk ingest.
+    
+    Reasoning: Verifies that indexing is only paused when bulk ingest is enabled
+    and that finalize_ingest restores the configured indexing threshold.
+    """
+    mock_client = MagicMock()
+    
+    # Disabled by default: the collection must not be touched
+    with patch('backend.app.services.vector_store.settings.QDRANT_BULK_INGEST', False):
+        assert begin_bulk_ingest(mock_client, "test_collection") is False
+        mock_client.update_collection.assert_not_called()
+    
+    with patch('backend.app.services.vector_store.settings.QDRANT_BULK_INGEST', True), \
+         patch('backend.app.services.vector_store.settings.QDRANT_INDEXING_THRESHOLD', 20000):
+        assert begin_bulk_ingest(mock_client, "test_collection") is True
+        paused_config = mock_client.update_collection.call_args[1]['optimizer_config']
+        assert paused_config.indexing_threshold == 0
+        
+        assert finalize_ingest(mock_client, "test_collection") is True
+        restored_config = mock_client.update_collection.call_args[1]['optimizer_config']
+        assert restored_config.indexing_threshold == 20000
+
 def test_store_document_success():
     """
     Test successful document storage.
     
-    Reasoning: Verifies that documents are correctly embedded and stored in the
-    vector database, which is essential for later retrieval.
+    Reasoning: Verifies that documents are correctly embedded, buffered, and written
+    in a single upsert on flush, which is essential for later retrieval.
     """
     # Mocks
     mock_client = MagicMock()
@@ -120,12 +149,38 @@ def test_store_document_success():
     with patch('backend.app.services.vector_store.generate_embedding', return_value=mock_embeddings) as mock_embed, \
          patch('backend.app.services.vector_store.settings.EMBEDDING_MODEL_NAME', 'test-model'):
         # Call the real function - not through VectorService
-        result = store_document(mock_client, test_collection, test_doc_id, test_text, test_metadata)
+        with pytest.deprecated_call():
+            result = store_document(mock_client, test_collection, test_doc_id, test_text, test_metadata)
         
         # Assertions
         mock_embed.assert_called_once_with(test_text, 'test-model')
-        mock_client.upsert.assert_called_once()
         assert result is True
+        # Nothing is written until the buffer is flushed
+        mock_client.upsert.assert_not_called()
+        
+        assert flush_documents(mock_client, test_collection) is True
+        mock_client.upsert.assert_called_once()
+        assert len(mock_client.upsert.call_args[1]['points']) == 1
+
+def test_flush_documents_keeps_points_on_failure():
+    """
+    Test that a failed flush keeps the queued documents.
+    
+    Reasoning: Points are only dropped from the buffer once Qdrant has accepted
+    them, so a transient upsert error does not lose documents.
+    """
+    mock_client = MagicMock()
+    mock_client.upsert.side_effect = [Exception("Qdrant unavailable"), None]
+    test_collection = "test_collection"
+    
+    with patch('backend.app.services.vector_store.generate_embedding', return_value=[0.1, 0.2, 0.3]):
+        with pytest.deprecated_call():
+            store_document(mock_client, test_collection, "test_doc_1", "This is a test document", {})
+        
+        assert flush_documents(mock_client, test_collection) is False
+        assert flush_documents(mock_client, test_collection) is True
+        assert mock_client.upsert.call_count == 2
+        assert len(mock_client.upsert.call_args[1]['points']) == 1
 
 def test_store_document_embedding_failure():
     """
@@ -152,7 +207,35 @@ def test_store_document_embedding_failure():
         mock_client.upsert.assert_not_called()
         assert result is False
 
-@pytest.mark.asyncio
+def test_process_and_store_blocks_deduplicates_texts(tmp_path):
+    """
+    Test that blocks with identical text share a single embedding.
+    
+    Reasoning: Boilerplate blocks repeat across transcripts, and each unique
+    text should only be embedded once while every block is still stored.
+    """
+    mock_client = MagicMock()
+    blocks = [
+        {"block_id": 1, "lines": ["hey", "hi"], "tagging_result": [{"tone": "playful"}]},
+        {"block_id": 2, "lines": ["so anyway"], "tagging_result": [{"tone": "dry"}]},
+        {"block_id": 3, "lines": ["hey", "hi"], "tagging_result": [{"tone": "flirty"}]},
+    ]
+    input_file = tmp_path / "tagged.json"
+    input_file.write_text(json.dumps([{"chunk_num": 1, "processed_blocks": blocks}]))
+    
+    with patch('backend.app.services.vector_store.generate_embeddings',
+               return_value=[[0.1, 0.2], [0.3, 0.4]]) as mock_embed:
+        process_and_store_blocks(str(input_file), mock_client, "test_collection")
+    
+    # Only the two unique texts are embedded
+    mock_embed.assert_called_once()
+    assert mock_embed.call_args[0][0] == ["hey\nhi", "so anyway"]
+    
+    points = mock_client.upsert.call_args[1]['points']
+    assert [point.id for point in points] == ["chunk_1_block_1", "chunk_1_block_2", "chunk_1_block_3"]
+    assert points[0].vector == points[2].vector == [0.1, 0.2]
+    assert points[2].payload["tone"] == "flirty"
+
 async def test_vector_service_retrieve_examples_success():
     """
     Test successful retrieval of examples via the VectorService class.
@@ -198,7 +281,68 @@ async def test_vector_service_retrieve_examples_success():
         )
         assert results == expected_results
 
-@pytest.mark.asyncio
+async def test_vector_service_retrieve_examples_with_async_embedder():
+    """
+    Test retrieval when an async embedder provides the query embedding.
+    
+    Reasoning: Verifies that the embedding from the async client is passed
+    through so the vector store doesn't embed the query again.
+    """
+    mock_client = MagicMock()
+    mock_embedder = AsyncMock()
+    mock_embedder.embed.return_value = [0.1, 0.2, 0.3]
+    
+    vector_service = VectorService(
+        qdrant_client=mock_client,
+        collection_name="test_collection",
+        embedder=mock_embedder
+    )
+    
+    with patch('backend.app.services.vector_store.retrieve_relevant_examples', return_value={"ids": []}) as mock_retrieve:
+        await vector_service.retrieve_relevant_examples(
+            user_input="test query",
+            conversation_history=SAMPLE_MESSAGES,
+            scenario=SAMPLE_SCENARIO
+        )
+        
+        mock_embedder.embed.assert_awaited_once()
+        assert mock_embedder.embed.call_args[0][0].startswith("test query")
+        assert mock_retrieve.call_args[1]["query_embedding"] == [0.1, 0.2, 0.3]
+
+async def test_vector_service_retrieve_examples_with_turn_embeddings():
+    """
+    Test retrieval from cached per-turn embeddings.
+
+    Reasoning: Only the new user input should be embedded; the query vector is
+    the mean of it and the previously cached turns, and the new embedding is
+    cached only when the turn is recorded.
+    """
+    mock_embedder = AsyncMock()
+    mock_embedder.embed.return_value = [0.3, 0.5]
+    turn_embeddings = [[0.1, 0.1]]
+
+    vector_service = VectorService(
+        qdrant_client=MagicMock(),
+        collection_name="test_collection",
+        embedder=mock_embedder,
+        turn_embeddings=turn_embeddings
+    )
+
+    with patch('backend.app.services.vector_store.retrieve_relevant_examples', return_value={"ids": []}) as mock_retrieve:
+        await vector_service.retrieve_relevant_examples(
+            user_input="test query",
+            conversation_history=SAMPLE_MESSAGES,
+            scenario=SAMPLE_SCENARIO
+        )
+
+        mock_embedder.embed.assert_awaited_once_with("test query")
+        assert turn_embeddings == [[0.1, 0.1]]
+        assert mock_retrieve.call_args[1]["query_embedding"] == pytest.approx([0.2, 0.3])
+
+    # The new turn is only cached once it has been recorded
+    vector_service.record_turn()
+    assert turn_embeddings == [[0.1, 0.1], [0.3, 0.5]]
+
 async def test_vector_service_retrieve_examples_missing_resources():
     """
     Test example retrieval with missing resources.
@@ -218,7 +362,6 @@ async def test_vector_service_retrieve_examples_missing_resources():
     # Should return empty dict when resources not available
     assert results == {}
 
-@pytest.mark.asyncio
 async def test_vector_service_retrieve_examples_error():
     """
     Test error handling during example retrieval.